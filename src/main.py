@@ -1036,6 +1036,7 @@ class _WorldPort:
     )
     recompute_coc_derived = staticmethod(world_impl.recompute_coc_derived)
     skill_check_coc = staticmethod(world_impl.skill_check_coc)
+    batch_skill_check_coc = staticmethod(world_impl.batch_skill_check_coc)
     set_weapon_defs = staticmethod(world_impl.set_weapon_defs)
     set_arts_defs = staticmethod(world_impl.set_arts_defs)
     get_arts_defs = staticmethod(world_impl.get_arts_defs)
@@ -1294,6 +1295,23 @@ def _extract_top_json(text: str) -> Optional[str]:
     return js
 
 
+try:  # optional faster JSON parser for model replies; stdlib json is the fallback
+    import orjson as _orjson  # type: ignore
+except Exception:
+    _orjson = None
+
+
+def _json_loads(js: str) -> Any:
+    """Parse JSON with orjson when available; anything it rejects (e.g. NaN literals)
+    goes through stdlib json, which also keeps the familiar error messages."""
+    if _orjson is not None:
+        try:
+            return _orjson.loads(js)
+        except Exception:
+            pass
+    return json.loads(js)
+
+
 def _parse_json_reply(text: str) -> Tuple[List[str], List[str], List[Tuple[str, dict]]]:
     """Parse a strict JSON reply into (speech_lines, description_lines, actions).
 
@@ -1306,7 +1324,7 @@ def _parse_json_reply(text: str) -> Tuple[List[str], List[str], List[Tuple[str,
     js = _extract_top_json(text)
     if not js:
         raise ValueError("no_json_found")
-    data = json.loads(js)
+    data = _json_loads(js)
     if not isinstance(data, dict):
         raise ValueError("json_not_object")
     def _norm_list(val) -> List[str]:
@@ -1,12 +1,20 @@
 # Minimal world state and tools for the demo; designed to be pure and easy to test.
 from __future__ import annotations
+from collections import deque
+from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Dict, Tuple, Any, List, Optional, Set, Union
+from functools import lru_cache
+from operator import itemgetter
+from typing import Dict, Deque, Tuple, Any, Callable, List, Mapping, Optional, Set, Union
 from pathlib import Path
+from types import MappingProxyType
+import heapq
 import json
 import math
+import os
 import random
 import re
+import sys
 try:
     from agentscope.tool import ToolResponse  # type: ignore
     from agentscope.message import TextBlock  # type: ignore
@@ -22,14 +30,45 @@ class TextBlock(dict):  # type: ignore
             super().__init__(type=type, text=text)
 
 
+def _text(msg: str) -> TextBlock:
+    """Build a plain text block (the common content item of every ToolResponse)."""
+    return TextBlock(type="text", text=msg)
+
+
+def _extend_text_blocks(parts: List[Any], content: Optional[List[Any]]) -> None:
+    """Append the text blocks of a nested ToolResponse's content to `parts`.
+
+    Blocks built in this module are TextBlock dicts, so `.get` is tried first;
+    attribute-style blocks (objects with a `type` field) are accepted as well.
+    """
+    if not content:
+        return
+    append = parts.append
+    for blk in content:
+        try:
+            kind = blk.get("type")
+        except AttributeError:
+            kind = getattr(blk, "type", None)
+        if kind == "text":
+            append(blk)
+
+
+try:  # optional faster JSON parser; stdlib json is the fallback
+    import orjson as _orjson  # type: ignore
+except Exception:
+    _orjson = None
+
+
 # --- Config loaders (migrated from main) ---
 # Keep the logic close to the world so the component owns how its data is sourced.
 
+@lru_cache(maxsize=None)
 def project_root() -> Path:
     """Return repository root (folder that contains configs/ and src/).
 
     Walk upwards from this file to find a directory that contains a
     `configs/` folder. Fallback heuristics mirror the ones used in main.
+    Resolved once per process; the checkout does not move at runtime.
     """
     here = Path(__file__).resolve()
     for parent in here.parents:
@@ -45,16 +84,36 @@ def project_root() -> Path:
         return here.parents[1]
 
 
+@lru_cache(maxsize=None)
 def _configs_dir() -> Path:
     return project_root() / "configs"
 
 
+@lru_cache(maxsize=32)
+def _load_json_cached(path_str: str, mtime_ns: int, size: int) -> Any:
+    """Parse a JSON file once per (path, mtime, size); edits on disk produce a new key."""
+    raw = Path(path_str).read_bytes()
+    if _orjson is not None:
+        return _orjson.loads(raw)
+    return json.loads(raw.decode("utf-8"))
+
+
+def _clone_json(obj: Any) -> Any:
+    # JSON trees hold only dict/list/scalars, so this is much cheaper than copy.deepcopy
+    if isinstance(obj, dict):
+        return {k: _clone_json(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_clone_json(v) for v in obj]
+    return obj
+
+
 def _load_json(path: Path) -> dict:
-    with path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
+    st = path.stat()
+    data = _load_json_cached(str(path), st.st_mtime_ns, st.st_size)
     if not isinstance(data, dict):
         raise ValueError(f"expected object at {path}, got {type(data).__name__}")
-    return data
+    # Callers may keep nested objects in WORLD and mutate them; never hand out the cached tree
+    return _clone_json(data)
 
 
 def load_story_config(selected_id: Optional[str] = None) -> dict:
@@ -95,10 +154,10 @@ def load_weapons() -> dict:
 
 
 def load_arts() -> dict:
-    path = _configs_dir() / "arts.json"
-    if not path.exists():
+    try:
+        data = _load_json(_configs_dir() / "arts.json")
+    except FileNotFoundError:
         return {}
-    data = _load_json(path)
     if not isinstance(data, dict):
         return {}
     return data
@@ -107,26 +166,48 @@ def load_arts() -> dict:
 # --- Core grid configuration ---
 # Distances use grid steps only (简称“步”).
 DEFAULT_MOVE_SPEED_STEPS = 6  # standard humanoid walk in steps per turn
+# Relation score at or below which two actors count as hostile (hostiles_present default)
+HOSTILE_RELATION_THRESHOLD = -10
 DEFAULT_REACH_STEPS = 1       # default melee reach in steps
 # Dying rules: per-user request, a character at 0 HP enters a "dying" state and
 # dies after N of their own turns (or immediately upon taking damage again).
 DYING_TURNS_DEFAULT = 3
 
 # Action restriction rules for control/system statuses
-# Keys are lower-case effect names expected from arts_defs.control.effect
+# Keys are lower-case effect names expected from arts_defs.control.effect.
+# Block sets are frozen: _block_mask_for() caches masks derived from them.
 CONTROL_STATUS_RULES: Dict[str, Dict[str, Any]] = {
     # Hard disables
-    "stunned": {"blocks": {"all"}},
-    "paralyzed": {"blocks": {"all"}},
-    "sleep": {"blocks": {"all"}},
-    "frozen": {"blocks": {"all"}},
+    "stunned": {"blocks": frozenset({"all"})},
+    "paralyzed": {"blocks": frozenset({"all"})},
+    "sleep": {"blocks": frozenset({"all"})},
+    "frozen": {"blocks": frozenset({"all"})},
     # Partial
-    "silenced": {"blocks": {"cast"}},
-    "rooted": {"blocks": {"move"}},
-    "immobilized": {"blocks": {"move"}},
-    "restrained": {"blocks": {"move", "attack"}},
+    "silenced": {"blocks": frozenset({"cast"})},
+    "rooted": {"blocks": frozenset({"move"})},
+    "immobilized": {"blocks": frozenset({"move"})},
+    "restrained": {"blocks": frozenset({"move", "attack"})},
 }
 
+# One bit per control status; an action's mask ORs the statuses that block it,
+# so the gate is a single AND per active status instead of building rule sets.
+CONDITION_BITS: Dict[str, int] = {k: 1 << i for i, k in enumerate(CONTROL_STATUS_RULES)}
+
+
+@lru_cache(maxsize=None)
+def _block_mask_for(action: str) -> int:
+    """Bitmask of control statuses that block `action` (see CONTROL_STATUS_RULES)."""
+    mask = 0
+    for k, rule in CONTROL_STATUS_RULES.items():
+        blocks = rule.get("blocks", ())
+        if "all" in blocks or action in blocks or (action != "move" and "action" in blocks):
+            mask |= CONDITION_BITS[k]
+    return mask
+
+
+# Actions refused outright while dying or at 0 HP
+_DYING_BLOCKED_ACTS = frozenset({"move", "attack", "cast", "dash", "disengage", "action"})
+
 # Human-readable labels for actions
 _ACTION_LABEL = {
     "move": "移动",
@@ -154,40 +235,70 @@ def format_distance_steps(steps: int) -> str:
     return f"{s}步"
 
 
+def _fmt_distance(steps: Optional[int]) -> str:
+    """Like format_distance_steps, but renders an unknown distance (None) as "未知"."""
+    if steps is None:
+        return "未知"
+    return format_distance_steps(int(steps))
+
+
 def _default_move_steps() -> int:
     return int(DEFAULT_MOVE_SPEED_STEPS) if DEFAULT_MOVE_SPEED_STEPS > 0 else 1
 
 
+def _name(n: Any) -> str:
+    """Canonical actor-name key: str() then interned, so repeated dict probes
+    and equality checks on the same name compare by identity first."""
+    return sys.intern(str(n))
+
+
 def _pair_key(a: str, b: str) -> Tuple[str, str]:
     """Return a sorted key for undirected pair-based state."""
-    return tuple(sorted([str(a), str(b)]))
+    sa, sb = str(a), str(b)
+    return (sa, sb) if sa <= sb else (sb, sa)
 
 
 def _rel_key(a: str, b: str) -> Tuple[str, str]:
     """Return a directed key representing a->b relation."""
-    return str(a), str(b)
+    return _name(a), _name(b)
 
 
-@dataclass
+@dataclass(slots=True)
 class World:
     # Monotonic version to help higher layers cache snapshots/runtime.
+    # Fields marked "cached" are read by the version-keyed memos (visible_snapshot_for,
+    # story_ended): any code that writes them must call _touch() (or run inside bulk_update).
     version: int = 0
-    time_min: int = 8 * 60  # 08:00 in minutes
-    weather: str = "sunny"
-    relations: Dict[Tuple[str, str], int] = field(default_factory=dict)
-    inventory: Dict[str, Dict[str, int]] = field(default_factory=dict)
+    time_min: int = 8 * 60  # 08:00 in minutes; cached
+    weather: str = "sunny"  # cached
+    relations: Dict[Tuple[str, str], int] = field(default_factory=dict)  # cached
+    inventory: Dict[str, Dict[str, int]] = field(default_factory=dict)  # cached
+    # cached (including nested sheet blocks such as coc.terra.infection)
     characters: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # Canonical (int, int) tuples; write through set_position()/_place() only; cached
     positions: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    # Spatial index over positions: cell -> names, plus name -> indexed cell (see _place)
+    pos_index: Dict[Tuple[int, int], Set[str]] = field(default_factory=dict, repr=False)
+    pos_cell: Dict[str, Tuple[int, int]] = field(default_factory=dict, repr=False)
     objective_positions: Dict[str, Tuple[int, int]] = field(default_factory=dict)
-    location: str = "罗德岛·会议室"
-    objectives: List[str] = field(default_factory=list)
-    objective_status: Dict[str, str] = field(default_factory=dict)
+    location: str = "罗德岛·会议室"  # cached
+    objectives: List[str] = field(default_factory=list)  # cached
+    objective_status: Dict[str, str] = field(default_factory=dict)  # cached
     objective_notes: Dict[str, str] = field(default_factory=dict)
-    # Scene flavor/details lines to help agents ground their narration
+    # Scene flavor/details lines to help agents ground their narration; cached
     scene_details: List[str] = field(default_factory=list)
-    events: List[Dict[str, Any]] = field(default_factory=list)
-    tension: int = 1  # 0-5
-    marks: List[str] = field(default_factory=list)
+    # Timeline: min-heap of (at_min, seq, event); seq keeps same-minute events in scheduling order.
+    # at_min is coerced to int on insert (schedule_event / story loader) and is never re-cast on read.
+    events: List[Tuple[int, int, Dict[str, Any]]] = field(default_factory=list)
+    # Next tie-break sequence number for events (see schedule_event)
+    event_seq: int = field(default=0, repr=False)
+    # seq ids cancelled via cancel_event(); entries are dropped lazily when they reach the heap top
+    event_cancelled: Set[int] = field(default_factory=set, repr=False)
+    # seq ids still queued and not cancelled (the only ids cancel_event accepts)
+    event_pending: Set[int] = field(default_factory=set, repr=False)
+    tension: int = 1  # 0-5; cached
+    # Most recent environment marks; the deque evicts the oldest beyond 10; cached
+    marks: Deque[str] = field(default_factory=lambda: deque(maxlen=10))
     # Compatibility: legacy field referenced by tests; remains a no-op container
     hidden_enemies: Dict[str, Any] = field(default_factory=dict)
     # --- Combat (rounds) removed ---
@@ -200,34 +311,67 @@ class World:
     cover: Dict[str, str] = field(default_factory=dict)
     # conditions container retained for compatibility, but only 'dying' is kept in logic now.
     # Other states like hidden/prone/grappled/etc. are removed.
-    conditions: Dict[str, Set[str]] = field(default_factory=dict)
+    # Values are always structured status dicts (see _statuses_for); legacy string-sets are not stored.
+    conditions: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
     # lightweight triggers queue (ready/opportunity_attack, etc.)
     triggers: List[Dict[str, Any]] = field(default_factory=list)
     # --- Weapons/Arts (simple dictionaries, configured at startup) ---
     weapon_defs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     arts_defs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
-    # Participants order for the current scene (names only)
+    # Sanitized, id-sorted views of the tables above; rebuilt only by their setters; weapon_summary is cached
+    weapon_summary: Dict[str, Dict[str, Any]] = field(default_factory=dict, repr=False)
+    arts_summary: Dict[str, Dict[str, Any]] = field(default_factory=dict, repr=False)
+    # Bumped by set_arts_defs only; keys the per-art compiled cache used by cast_arts
+    arts_defs_version: int = field(default=0, repr=False)
+    # Participants order for the current scene (names only); cached
     participants: List[str] = field(default_factory=list)
+    # Membership view of participants, rebuilt by set_participants() for O(1) gating
+    participant_set: frozenset = field(default_factory=frozenset)
+    # Copy of the participants list participant_set was built from (see _participant_set)
+    participant_src: List[str] = field(default_factory=list, repr=False)
     # Protection links: protectee -> ordered list of guardians
     guardians: Dict[str, List[str]] = field(default_factory=dict)
+    # Reverse view: guardian -> protectees; may hold stale entries, so verify against guardians
+    guardian_index: Dict[str, Set[str]] = field(default_factory=dict, repr=False)
     # --- Multi-scene (entrances) minimal support ---
-    # Scenes registry and per-actor scene membership
+    # Scenes registry and per-actor scene membership; all three are cached
     scenes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     entrances: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     scene_of: Dict[str, str] = field(default_factory=dict)
     # --- Endings (multi-rule) ---
-    # Normalized endings definitions loaded from story config
+    # Normalized endings definitions loaded from story config; cached
     endings_defs: List[Dict[str, Any]] = field(default_factory=list)
     # Frozen result once an ending is reached; None when not ended yet
     ending_state: Optional[Dict[str, Any]] = None
+    # Nesting depth of bulk_update(); while > 0, _touch() is deferred to the outermost exit
+    bulk_depth: int = field(default=0, repr=False)
 
     def _touch(self) -> None:
+        if self.bulk_depth:
+            return
         try:
             self.version += 1
         except Exception:
             # be defensive; never fail mutators due to versioning
             self.version = int(self.version or 0) + 1
 
+    @contextmanager
+    def bulk_update(self):
+        """Batch many mutations into a single version bump.
+
+        Version-keyed caches are invalidated once on entry and once on exit; reads
+        made inside the block may be served from caches built inside it.
+        """
+        if not self.bulk_depth:
+            self._touch()
+        self.bulk_depth += 1
+        try:
+            yield self
+        finally:
+            self.bulk_depth -= 1
+            if not self.bulk_depth:
+                self._touch()
+
     # snapshot() removed by design. Only use visible_snapshot_for(name, filter_to_scene=True).
 
 
@@ -242,13 +386,27 @@ def _parse_story_positions(obj: Any, out: Dict[str, Tuple[int, int]]) -> None:
         return
     for k, v in obj.items():
         if isinstance(v, (list, tuple)) and len(v) >= 2:
-            try:
-                x, y = int(v[0]), int(v[1])
-            except Exception:
+            x, y = _safe_int(v[0]), _safe_int(v[1])
+            if x is None or y is None:
                 continue
             out[str(k)] = (x, y)
 
 
+def _safe_int(v: Any, default: Optional[int] = None) -> Optional[int]:
+    """int(v) for config/tool/sheet values, or `default` when missing or not convertible.
+
+    Plain ints (the common case for decoded JSON and sheets) return without entering a try block.
+    """
+    if v.__class__ is int:
+        return v
+    if v is None:
+        return default
+    try:
+        return int(v)
+    except (TypeError, ValueError, OverflowError):
+        return default
+
+
 def _normalize_scene_cfg(sc: Optional[Dict[str, Any]]):
     name = None
     objectives: List[str] = []
@@ -347,11 +505,28 @@ def _normalize_endings_list(defs: Any) -> List[Dict[str, Any]]:
         w = item.get("when")
         if isinstance(w, list):
             w = {"any": list(w)}
-        d["when"] = w if isinstance(w, (dict, list)) else None
+        d["when"] = _prepare_when(w) if isinstance(w, (dict, list)) else None
         out.append(d)
     return out
 
 
+def _prepare_when(node: Any) -> Any:
+    """Copy a when-tree, turning location_is lists into frozensets of str for O(1) tests."""
+    if isinstance(node, list):
+        return [_prepare_when(x) for x in node]
+    if not isinstance(node, dict):
+        return node
+    out: Dict[str, Any] = {}
+    for k, v in node.items():
+        if k == "location_is" and isinstance(v, list):
+            out[k] = frozenset(str(x) for x in v)
+        elif k in ("all", "any", "not"):
+            out[k] = _prepare_when(v)
+        else:
+            out[k] = v
+    return out
+
+
 def init_world_from_configs(*, selected_story_id: Optional[str] = None, reset: bool = True) -> dict:
     """Initialise WORLD from configs folder in a single call.
 
@@ -360,54 +535,56 @@ def init_world_from_configs(*, selected_story_id: Optional[str] = None, reset: b
     - Applies weapon/arts defs, character sheets/meta/inventory, positions/participants,
       scene fields, and relations.
 
+    Config values are shape-checked up front so the mutators below run without a
+    try/except around every call; only steps that can reject content keep one.
     Returns the current WORLD snapshot for convenience.
     """
     if reset:
         reset_world()
+    with WORLD.bulk_update():
+        return _apply_story_configs(selected_story_id)
+
+
+def _apply_story_configs(selected_story_id: Optional[str]) -> dict:
     # Load tables
     story = load_story_config(selected_story_id)
+    if not isinstance(story, dict):
+        story = {}
     chars = load_characters()
     weapons = load_weapons() or {}
     arts = load_arts() or {}
-    # Weapon/Arts defs
+    # Weapon/Arts defs (setters raise ValueError on schema violations)
     try:
         set_weapon_defs(weapons)
-    except Exception:
+    except ValueError:
         pass
     try:
         set_arts_defs(arts)
-    except Exception:
+    except ValueError:
         pass
     # Characters: meta + stat block + inventory
     actor_entries: Dict[str, Any] = dict(chars or {})
     # Extract and remove relations from the character map for easier iteration
-    relations_map = dict(actor_entries.pop("relations", {}) or {}) if isinstance(actor_entries, dict) else {}
+    relations_map = actor_entries.pop("relations", None)
     for nm, entry in actor_entries.items():
         if not isinstance(entry, dict):
             continue
         # type hint for agent orchestration (npc/player)
-        try:
-            tval = str((entry or {}).get("type", "npc")).lower()
-            if tval:
-                st = WORLD.characters.setdefault(str(nm), {})
-                st["type"] = tval
-        except Exception:
-            pass
+        tval = str(entry.get("type", "npc")).lower()
+        if tval:
+            WORLD.characters.setdefault(_name(nm), {})["type"] = tval
         # meta
-        try:
-            set_character_meta(
-                nm,
-                persona=entry.get("persona"),
-                appearance=entry.get("appearance"),
-                quotes=entry.get("quotes"),
-            )
-        except Exception:
-            pass
-        # sheet
+        set_character_meta(
+            nm,
+            persona=entry.get("persona"),
+            appearance=entry.get("appearance"),
+            quotes=entry.get("quotes"),
+        )
+        # sheet (numeric fields come straight from authoring; keep one guard here)
         try:
             coc_block = entry.get("coc")
             if isinstance(coc_block, dict):
-                set_coc_character_from_config(name=nm, coc=coc_block or {})
+                set_coc_character_from_config(name=nm, coc=coc_block)
             else:
                 set_coc_character(
                     name=nm,
@@ -423,155 +600,103 @@ def init_world_from_configs(*, selected_story_id: Optional[str] = None, reset: b
                         "LUCK": 50,
                     },
                 )
-        except Exception:
+        except (TypeError, ValueError):
             pass
         # inventory
-        try:
-            inv = entry.get("inventory") or {}
-            if isinstance(inv, dict):
-                for it, cnt in inv.items():
-                    try:
-                        grant_item(target=nm, item=str(it), n=int(cnt))
-                    except Exception:
-                        pass
-        except Exception:
-            pass
+        inv = entry.get("inventory")
+        if isinstance(inv, dict):
+            for it, cnt in inv.items():
+                n = _safe_int(cnt)
+                if n is not None:
+                    grant_item(target=nm, item=str(it), n=n)
     # Positions and participants from story
     positions: Dict[str, Tuple[int, int]] = {}
-    try:
-        _parse_story_positions(story.get("initial_positions") or {}, positions)
-    except Exception:
-        pass
-    try:
-        _parse_story_positions(story.get("positions") or {}, positions)
-    except Exception:
-        pass
-    try:
-        initial = story.get("initial") if isinstance(story, dict) else None
-        if isinstance(initial, dict):
-            _parse_story_positions(initial.get("positions") or {}, positions)
-    except Exception:
-        pass
-    for nm, (x, y) in positions.items():
-        try:
-            set_position(nm, x, y)
-        except Exception:
-            pass
-    try:
-        set_participants(list(positions.keys()))
-    except Exception:
-        pass
+    _parse_story_positions(story.get("initial_positions"), positions)
+    _parse_story_positions(story.get("positions"), positions)
+    initial = story.get("initial")
+    if isinstance(initial, dict):
+        _parse_story_positions(initial.get("positions"), positions)
+    if positions:
+        # One bulk merge + reindex instead of a set_position()/_touch() per actor
+        WORLD.positions.update({_name(nm): xy for nm, xy in positions.items()})
+        _reindex_positions()
+        WORLD._touch()
+    set_participants(list(positions.keys()))
     # Relations from characters config top-level
     if isinstance(relations_map, dict):
         for src, mp in relations_map.items():
             if not isinstance(mp, dict):
                 continue
             for dst, val in mp.items():
-                try:
-                    score = max(-100, min(100, int(val)))
-                except Exception:
+                score = _safe_int(val)
+                if score is None:
                     continue
-                try:
-                    set_relation(str(src), str(dst), score, reason="配置设定")
-                except Exception:
-                    pass
+                set_relation(str(src), str(dst), max(-100, min(100, score)), reason="配置设定")
     # Scenes/Entrances (optional, minimal)
-    try:
-        sc_map = story.get("scenes") if isinstance(story, dict) else None
-        if isinstance(sc_map, dict):
-            WORLD.scenes = {str(k): dict(v or {}) for k, v in sc_map.items()}
-    except Exception:
-        pass
-    try:
-        ent_map = story.get("entrances") if isinstance(story, dict) else None
-        if isinstance(ent_map, dict):
-            WORLD.entrances = {str(k): dict(v or {}) for k, v in ent_map.items()}
-    except Exception:
-        pass
+    sc_map = story.get("scenes")
+    if isinstance(sc_map, dict):
+        WORLD.scenes = {str(k): dict(v) if isinstance(v, dict) else {} for k, v in sc_map.items()}
+    ent_map = story.get("entrances")
+    if isinstance(ent_map, dict):
+        WORLD.entrances = {str(k): dict(v) if isinstance(v, dict) else {} for k, v in ent_map.items()}
     # Events (optional, loaded into WORLD.events)
-    try:
-        ev_list = story.get("events") if isinstance(story, dict) else None
-        if isinstance(ev_list, list):
-            items = []
-            for ev in ev_list:
-                if not isinstance(ev, dict):
-                    continue
-                name = str(ev.get("name") or ev.get("id") or "(事件)")
-                # Accept minutes in 'at' or time string in 'time' / 'time_min'
-                at_val = ev.get("at")
-                at_min = None
-                try:
-                    if at_val is not None:
-                        at_min = int(at_val)
-                except Exception:
-                    at_min = None
-                if at_min is None:
-                    at_min = _parse_time_to_min(ev.get("time")) or _parse_time_to_min(ev.get("time_min"))
-                if at_min is None:
-                    # fallback: use current WORLD.time_min to avoid crashes
-                    at_min = int(WORLD.time_min)
-                note = str(ev.get("note") or ev.get("message") or "")
-                effects = list(ev.get("effects") or []) if isinstance(ev.get("effects"), list) else []
-                items.append({"name": name, "at": int(at_min), "note": note, "effects": effects})
-            items.sort(key=lambda x: int(x.get("at", 0)))
-            WORLD.events = items
-    except Exception:
-        pass
-    # Endings (optional)
-    try:
-        ends = story.get("endings") if isinstance(story, dict) else None
-        WORLD.endings_defs = _normalize_endings_list(ends)
-        WORLD.ending_state = None
-    except Exception:
-        WORLD.endings_defs = []
-        WORLD.ending_state = None
-    try:
-        init_scenes = story.get("initial_scenes") if isinstance(story, dict) else None
-        if isinstance(init_scenes, dict):
-            for nm, sc in init_scenes.items():
-                if isinstance(sc, str) and sc.strip():
-                    WORLD.scene_of[str(nm)] = sc.strip()
-    except Exception:
-        pass
-    try:
-        sp = story.get("scene_positions") if isinstance(story, dict) else None
-        if isinstance(sp, dict):
-            for scid, mp in sp.items():
-                if not isinstance(mp, dict):
-                    continue
-                for nm, v in mp.items():
-                    if isinstance(v, (list, tuple)) and len(v) >= 2:
-                        try:
-                            x, y = int(v[0]), int(v[1])
-                        except Exception:
-                            continue
-                        try:
-                            set_position(str(nm), x, y)
-                        except Exception:
-                            pass
-                        # If actor has no scene set yet, inherit this scene id
-                        try:
-                            WORLD.scene_of.setdefault(str(nm), str(scid))
-                        except Exception:
-                            pass
-    except Exception:
-        pass
+    ev_list = story.get("events")
+    if isinstance(ev_list, list):
+        items = []
+        for ev in ev_list:
+            if not isinstance(ev, dict):
+                continue
+            name = str(ev.get("name") or ev.get("id") or "(事件)")
+            # Accept minutes in 'at' or time string in 'time' / 'time_min'
+            at_min = _safe_int(ev.get("at"))
+            if at_min is None:
+                at_min = _parse_time_to_min(ev.get("time")) or _parse_time_to_min(ev.get("time_min"))
+            if at_min is None:
+                # fallback: use current WORLD.time_min to avoid crashes
+                at_min = int(WORLD.time_min)
+            note = str(ev.get("note") or ev.get("message") or "")
+            effects = list(ev.get("effects")) if isinstance(ev.get("effects"), list) else []
+            at = int(at_min)
+            items.append((at, WORLD.event_seq, {"name": name, "at": at, "note": note, "effects": effects}))
+            WORLD.event_seq += 1
+        heapq.heapify(items)
+        WORLD.events = items
+        WORLD.event_pending = {e[1] for e in items}
+        WORLD.event_cancelled = set()
+    # Endings (optional; the normalizer tolerates any shape)
+    WORLD.endings_defs = _normalize_endings_list(story.get("endings"))
+    WORLD.ending_state = None
+    init_scenes = story.get("initial_scenes")
+    if isinstance(init_scenes, dict):
+        for nm, sc in init_scenes.items():
+            if isinstance(sc, str) and sc.strip():
+                WORLD.scene_of[_name(nm)] = sc.strip()
+    sp = story.get("scene_positions")
+    if isinstance(sp, dict):
+        for scid, mp in sp.items():
+            if not isinstance(mp, dict):
+                continue
+            for nm, v in mp.items():
+                if isinstance(v, (list, tuple)) and len(v) >= 2:
+                    x, y = _safe_int(v[0]), _safe_int(v[1])
+                    if x is None or y is None:
+                        continue
+                    set_position(str(nm), x, y)
+                    # If actor has no scene set yet, inherit this scene id
+                    WORLD.scene_of.setdefault(_name(nm), str(scid))
 
     # Scene from story (legacy single-scene header)
-    sc = story.get("scene") if isinstance(story, dict) else None
+    sc = story.get("scene")
     name, obj, det, weather, time_min = _normalize_scene_cfg(sc if isinstance(sc, dict) else None)
     if any([name, obj, det, weather, time_min is not None]):
-        try:
-            set_scene(
-                name or (WORLD.location or ""),
-                obj or None,
-                append=False,
-                details=det or None,
-                weather=weather,
-                time_min=time_min,
-            )
-        except Exception:
-            pass
+        set_scene(
+            name or (WORLD.location or ""),
+            obj or None,
+            append=False,
+            details=det or None,
+            weather=weather,
+            time_min=time_min,
+        )
     # Do not expose a global snapshot; return minimal ack
     return {"ok": True}
 
@@ -666,12 +791,12 @@ def use_entrance(
     pos = WORLD.positions.get(nm)
     if pos is None:
         pos = (0, 0)
-        WORLD.positions[nm] = pos
-    if tuple(pos) != (ex, ey):
+        _place(nm, pos)
+    if pos != (ex, ey):
         mv = move_towards(nm, (ex, ey))
         meta = dict(mv.metadata or {})
         # If after movement we've arrived, fall through to enter
-        pos2 = tuple(WORLD.positions.get(nm) or pos)
+        pos2 = WORLD.positions.get(nm) or pos
         if pos2 != (ex, ey):
             text = f"朝入口靠近：{ent.get('label','')}（剩余 {meta.get('remaining', _grid_distance(pos2, (ex,ey)))} 步）"
             blocks = list(mv.content or [])
@@ -784,15 +909,12 @@ def _resolve_named_target_for_move(name: str, term: str) -> Optional[Tuple[Tuple
     except Exception:
         pass
     # 5) Another actor by name (same-scene only when both scenes known)
-    try:
-        pos = (WORLD.positions or {}).get(s)
-        if isinstance(pos, (tuple, list)) and len(pos) >= 2:
-            sc_tgt = _actor_scene(str(s))
-            if cur_scene and sc_tgt and str(cur_scene) != str(sc_tgt):
-                return None
-            return (int(pos[0]), int(pos[1])), {"kind": "actor", "id": s}
-    except Exception:
-        pass
+    pos = WORLD.positions.get(s)
+    if pos is not None:
+        sc_tgt = _actor_scene(s)
+        if cur_scene and sc_tgt and str(cur_scene) != str(sc_tgt):
+            return None
+        return pos, {"kind": "actor", "id": s}
     return None
 
 
@@ -818,14 +940,65 @@ def select_world(world_id: Optional[str] = None) -> dict:
 
 # ---- Visibility helpers and environment rendering ----
 
+# Per-version memo for visible_snapshot_for: owning world + version + {(name, filter): proxy}
+# Only correct while writers of the World fields marked "cached" call _touch() (see World).
+_SNAPSHOT_CACHE: Dict[str, Any] = {"world": None, "version": None, "views": {}}
+
+
 def visible_snapshot_for(
-    name: Optional[str], *, filter_to_scene: bool = True
-) -> dict:
+    name: Optional[str], *, filter_to_scene: bool = True, readonly: bool = False
+) -> Any:
     """Return a filtered snapshot representing what `name` can see.
 
     - Always scoped to a scene; if无法解析角色场景且 filter_to_scene=True，则返回空结构。
     - 不提供全局快照路径。
+    - Memoized per WORLD.version. The default result is a fresh top-level dict whose
+      nested values are shared with the cache (do not mutate them); readonly=True
+      returns a MappingProxyType over the cached snapshot with no copying at all.
     """
+    if _SNAPSHOT_CACHE["world"] is not WORLD or _SNAPSHOT_CACHE["version"] != WORLD.version:
+        _SNAPSHOT_CACHE["world"] = WORLD
+        _SNAPSHOT_CACHE["version"] = WORLD.version
+        _SNAPSHOT_CACHE["views"] = {}
+    key = (str(name) if name else None, bool(filter_to_scene))
+    view = _SNAPSHOT_CACHE["views"].get(key)
+    if view is None:
+        view = MappingProxyType(_build_visible_snapshot(name, filter_to_scene=filter_to_scene))
+        _SNAPSHOT_CACHE["views"][key] = view
+    return view if readonly else dict(view)
+
+
+# Config-only sections of the visible snapshot (scenes/entrances): section -> (source table, size, built view).
+# The tables are only ever replaced wholesale by their loaders, so the built view is reused across
+# versions until the source object (or its size) changes; like the rest of the snapshot it is shared.
+_STATIC_SECTIONS: Dict[str, Tuple[Any, int, Dict[str, Any]]] = {}
+
+
+def _static_section(section: str, src: Dict[str, Any], build: Callable[[Dict[str, Any]], Dict[str, Any]]) -> Dict[str, Any]:
+    cached = _STATIC_SECTIONS.get(section)
+    if cached is not None and cached[0] is src and cached[1] == len(src):
+        return cached[2]
+    out = build(src)
+    _STATIC_SECTIONS[section] = (src, len(src), out)
+    return out
+
+
+def _build_scenes_section(scenes: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: {"name": str((v or {}).get("name", k))} for k, v in scenes.items()}
+
+
+def _build_entrances_section(entrances: Dict[str, Any]) -> Dict[str, Any]:
+    return {eid: {
+        "label": str((e or {}).get("label", "")),
+        "from_scene": str((e or {}).get("from_scene", "")),
+        "to_scene": str((e or {}).get("to_scene", "")),
+        "at": (list((e or {}).get("at", [])) if isinstance((e or {}).get("at"), list) else None),
+        "spawn": (list((e or {}).get("spawn", [])) if isinstance((e or {}).get("spawn"), list) else None),
+        "desc": str((e or {}).get("desc") or (e or {}).get("description", "")),
+    } for eid, e in entrances.items()}
+
+
+def _build_visible_snapshot(name: Optional[str], *, filter_to_scene: bool) -> dict:
     # Resolve current scene id
     cur_scene_id: Optional[str] = None
     if name:
@@ -877,25 +1050,10 @@ def visible_snapshot_for(
         "characters": characters,
         "participants": parts,
         "scene_of": scene_of,
-        "weapon_defs": {wid: {
-            "label": str((wd or {}).get("label", "")),
-            "desc": str((wd or {}).get("desc") or (wd or {}).get("description", "")),
-            "reach_steps": int((wd or {}).get("reach_steps", DEFAULT_REACH_STEPS)),
-            "skill": str((wd or {}).get("skill", "")),
-            "defense_skill": str((wd or {}).get("defense_skill", "")),
-            "damage": str((wd or {}).get("damage", "")),
-            "damage_type": str((wd or {}).get("damage_type", "physical")),
-        } for wid, wd in (WORLD.weapon_defs or {}).items()},
+        "weapon_defs": dict(WORLD.weapon_summary),
         "inventory": dict(WORLD.inventory or {}),
-        "scenes": {k: {"name": str((v or {}).get("name", k))} for k, v in (WORLD.scenes or {}).items()},
-        "entrances": {eid: {
-            "label": str((e or {}).get("label", "")),
-            "from_scene": str((e or {}).get("from_scene", "")),
-            "to_scene": str((e or {}).get("to_scene", "")),
-            "at": (list((e or {}).get("at", [])) if isinstance((e or {}).get("at"), list) else None),
-            "spawn": (list((e or {}).get("spawn", [])) if isinstance((e or {}).get("spawn"), list) else None),
-            "desc": str((e or {}).get("desc") or (e or {}).get("description", "")),
-        } for eid, e in (WORLD.entrances or {}).items()},
+        "scenes": _static_section("scenes", WORLD.scenes or {}, _build_scenes_section),
+        "entrances": _static_section("entrances", WORLD.entrances or {}, _build_entrances_section),
     }
     # Expose relations in a lightweight form: "A->B": score. Scope to current scene when applicable.
     try:
@@ -1174,7 +1332,7 @@ def render_reach_preview_for(name: str) -> ToolResponse:
         except Exception:
             rsteps = 1
         weapons.append((wid_str, max(1, rsteps)))
-    weapons.sort(key=lambda t: (t[1], t[0]))
+    weapons.sort(key=_BY_STEPS_NAME)
     for wid, rsteps in weapons:
         try:
             items = list(reachable_targets_for_weapon(nm, wid))
@@ -1244,43 +1402,110 @@ def reaction_available(name: str) -> bool:
         return True
 
 
-def list_adjacent_units(name: str) -> List[Tuple[str, int]]:
+def _place(name: str, pos: Tuple[int, int]) -> None:
+    """Write an actor position and keep WORLD.pos_index in step with it."""
+    idx = WORLD.pos_index
+    old = WORLD.pos_cell.get(name)
+    if old is not None:
+        bucket = idx.get(old)
+        if bucket is not None:
+            bucket.discard(name)
+            if not bucket:
+                del idx[old]
+    WORLD.positions[name] = pos
+    WORLD.pos_cell[name] = pos
+    idx.setdefault(pos, set()).add(name)
+
+
+def _reindex_positions() -> None:
+    """Rebuild WORLD.pos_index/pos_cell from WORLD.positions."""
+    idx: Dict[Tuple[int, int], Set[str]] = {}
+    for nm, pos in WORLD.positions.items():
+        idx.setdefault(pos, set()).add(nm)
+    WORLD.pos_index = idx
+    WORLD.pos_cell = dict(WORLD.positions)
+
+
+def _ensure_pos_index() -> Dict[Tuple[int, int], Set[str]]:
+    """Return the spatial index, rebuilding it if positions were edited behind _place()."""
+    # Full dict compare (C-level, no allocation) so same-size direct edits are caught too
+    if WORLD.pos_cell != WORLD.positions:
+        _reindex_positions()
+    return WORLD.pos_index
+
+
+# Sort key for (unit, steps) results: nearest first, then by name
+_BY_STEPS_NAME = itemgetter(1, 0)
+
+
+def _units_within(
+    name: str, cx: int, cy: int, radius: int, k: Optional[int] = None
+) -> List[Tuple[str, int]]:
+    """Return (unit, steps) within Manhattan `radius` of (cx, cy), excluding `name`.
+
+    Probes the spatial index cell by cell when the diamond is smaller than the
+    set of occupied cells; otherwise sweeps the occupied cells once, so units
+    stacked on one cell share a single distance computation. With `k`, only the
+    k nearest are returned.
+    """
+    out: List[Tuple[str, int]] = []
+    r = max(0, int(radius))
+    positions = WORLD.positions
+    idx = _ensure_pos_index()
+    if 2 * r * (r + 1) + 1 <= len(idx):
+        for dx in range(-r, r + 1):
+            rem = r - abs(dx)
+            for dy in range(-rem, rem + 1):
+                cell = (cx + dx, cy + dy)
+                bucket = idx.get(cell)
+                if not bucket:
+                    continue
+                d = abs(dx) + abs(dy)
+                for nm in bucket:
+                    # Guard against entries that went stale via direct dict edits
+                    if nm != name and positions.get(nm) == cell:
+                        out.append((nm, d))
+    else:
+        # Index cells are int tuples already, so no per-unit coercion is needed here
+        for cell, bucket in idx.items():
+            d = abs(cx - cell[0]) + abs(cy - cell[1])
+            if d > r:
+                continue
+            for nm in bucket:
+                if nm != name and positions.get(nm) == cell:
+                    out.append((nm, d))
+    if k is not None:
+        return heapq.nsmallest(max(0, int(k)), out, key=_BY_STEPS_NAME)
+    out.sort(key=_BY_STEPS_NAME)
+    return out
+
+
+def list_adjacent_units(name: str, k: Optional[int] = None) -> List[Tuple[str, int]]:
     """Return units within 1 step (Manhattan) of `name` as (unit, steps).
 
     - Excludes self; ignores participants gating (consistent with prior preview).
-    - Returns a list sorted by (steps, name).
+    - Returns a list sorted by (steps, name); `k` keeps only the k nearest.
     """
     me = WORLD.positions.get(str(name))
-    if not (isinstance(me, tuple) or isinstance(me, list)):
+    if me is None:
         return []
-    mx, my = int(me[0]), int(me[1])
-    out: List[Tuple[str, int]] = []
-    for nm, pos in (WORLD.positions or {}).items():
-        if str(nm) == str(name):
-            continue
-        if not (isinstance(pos, tuple) or isinstance(pos, list)):
-            continue
-        try:
-            d = abs(mx - int(pos[0])) + abs(my - int(pos[1]))
-        except Exception:
-            continue
-        if d <= 1:
-            out.append((str(nm), int(d)))
-    out.sort(key=lambda t: (t[1], t[0]))
-    return out
+    mx, my = me
+    return _units_within(str(name), mx, my, 1, k)
 
 
-def reachable_targets_for_weapon(attacker: str, weapon: str) -> List[Tuple[str, int]]:
+def reachable_targets_for_weapon(
+    attacker: str, weapon: str, k: Optional[int] = None
+) -> List[Tuple[str, int]]:
     """Return targets within weapon reach (steps) for `attacker`.
 
     - Requires attacker position and weapon definition; if attacker lacks the
       weapon in inventory (count <= 0), returns empty list (consistent with preview).
     - Ignores participants gating and guard interception by design (preview only).
-    - Returns list sorted by (steps, name).
+    - Returns list sorted by (steps, name); `k` keeps only the k nearest.
     """
     att = str(attacker)
     pos_a = WORLD.positions.get(att)
-    if not (isinstance(pos_a, tuple) or isinstance(pos_a, list)):
+    if pos_a is None:
         return []
     wid = str(weapon)
     wdef = (WORLD.weapon_defs or {}).get(wid)
@@ -1291,59 +1516,35 @@ def reachable_targets_for_weapon(attacker: str, weapon: str) -> List[Tuple[str,
     except Exception:
         reach_steps = int(DEFAULT_REACH_STEPS)
     # Ownership gate for preview (match main's previous behavior)
-    bag = dict(WORLD.inventory.get(att, {}) or {})
+    bag = WORLD.inventory.get(att) or {}
     try:
         if int(bag.get(wid, 0)) <= 0:
             return []
     except Exception:
         return []
-    ax, ay = int(pos_a[0]), int(pos_a[1])
-    out: List[Tuple[str, int]] = []
-    for nm, pos in (WORLD.positions or {}).items():
-        if str(nm) == att:
-            continue
-        if not (isinstance(pos, tuple) or isinstance(pos, list)):
-            continue
-        try:
-            d = abs(ax - int(pos[0])) + abs(ay - int(pos[1]))
-        except Exception:
-            continue
-        if d <= reach_steps:
-            out.append((str(nm), int(d)))
-    out.sort(key=lambda t: (t[1], t[0]))
-    return out
+    ax, ay = pos_a
+    return _units_within(att, ax, ay, reach_steps, k)
 
 
-def reachable_targets_for_art(attacker: str, art: str) -> List[Tuple[str, int]]:
+def reachable_targets_for_art(
+    attacker: str, art: str, k: Optional[int] = None
+) -> List[Tuple[str, int]]:
     """Return targets within art range (steps) for `attacker`.
 
     - Uses arts_defs.range_steps; ignores LOS/participants/guards (preview only).
-    - Returns list sorted by (steps, name).
+    - Returns list sorted by (steps, name); `k` keeps only the k nearest.
     """
     att = str(attacker)
     pos_a = WORLD.positions.get(att)
-    if not (isinstance(pos_a, tuple) or isinstance(pos_a, list)):
+    if pos_a is None:
         return []
     ad = (WORLD.arts_defs or {}).get(str(art)) or {}
     try:
         rng = max(1, int(ad.get("range_steps", 6)))
     except Exception:
         rng = 6
-    ax, ay = int(pos_a[0]), int(pos_a[1])
-    out: List[Tuple[str, int]] = []
-    for nm, pos in (WORLD.positions or {}).items():
-        if str(nm) == att:
-            continue
-        if not (isinstance(pos, tuple) or isinstance(pos, list)):
-            continue
-        try:
-            d = abs(ax - int(pos[0])) + abs(ay - int(pos[1]))
-        except Exception:
-            continue
-        if d <= rng:
-            out.append((str(nm), int(d)))
-    out.sort(key=lambda t: (t[1], t[0]))
-    return out
+    ax, ay = pos_a
+    return _units_within(att, ax, ay, rng, k)
 
 
 # ---- World-level rule queries used by engine orchestration ----
@@ -1360,12 +1561,15 @@ def is_dead(name: Optional[str]) -> bool:
         return False
 
 
-def hostiles_present(participants: Optional[List[str]] = None, threshold: int = -10) -> bool:
+def hostiles_present(
+    participants: Optional[List[str]] = None, threshold: int = HOSTILE_RELATION_THRESHOLD
+) -> bool:
     """Return True if there exists a hostile pair (relation<=threshold) among living actors.
 
     - Candidate set priority: participants if provided; else those with positions; else all characters.
     - Living: hp > 0（濒死也视为不“存活”以匹配原主循环用于战斗继续性的语义）。
-    - Relations source: WORLD.relations (tuple keys (a,b)).
+    - Relations source: WORLD.relations (tuple keys (a,b)), read directly on every call so
+      scores written straight into the dict are seen too.
     """
     # Resolve field names
     if participants:
@@ -1377,32 +1581,37 @@ def hostiles_present(participants: Optional[List[str]] = None, threshold: int =
         else:
             names = [str(n) for n in (WORLD.characters or {}).keys()]
     # Filter living (hp>0)
+    # names are str already; no re-coercion per lookup
     live = []
     for nm in names:
         try:
-            st = WORLD.characters.get(str(nm), {})
+            st = WORLD.characters.get(nm, {})
             if int(st.get("hp", 1)) > 0:
-                live.append(str(nm))
+                live.append(nm)
         except Exception:
-            live.append(str(nm))
+            live.append(nm)
     if len(live) <= 1:
         return False
-    # Build relation lookup
-    rel = dict(WORLD.relations or {})
+    rel = WORLD.relations or {}
     thr = int(threshold)
-    for i, a in enumerate(live):
-        for b in live[i + 1 :]:
-            try:
-                sc_ab = int(rel.get((a, b), 0))
-            except Exception:
-                sc_ab = 0
-            try:
-                sc_ba = int(rel.get((b, a), 0))
-            except Exception:
-                sc_ba = 0
-            if sc_ab <= thr or sc_ba <= thr:
-                return True
-    return False
+    # Missing pairs score 0, so a negative threshold can only be met by stored edges:
+    # scan the (usually much smaller) relation table instead of every live pair.
+    if thr < 0:
+        live_set = set(live)
+        for (a, b), sc in rel.items():
+            if a != b and a in live_set and b in live_set:
+                try:
+                    if int(sc) <= thr:
+                        return True
+                except Exception:
+                    continue
+        return False
+    # Scores are stored as ints by _set_relation_score, so no coercion per pair
+    return any(
+        rel.get((a, b), 0) <= thr or rel.get((b, a), 0) <= thr
+        for i, a in enumerate(live)
+        for b in live[i + 1 :]
+    )
 
 def reset_world() -> None:
     """Reset the global WORLD to a fresh, empty instance.
@@ -1417,19 +1626,25 @@ def set_participants(names: List[str]) -> ToolResponse:
 
     Stores only strings; preserves order and removes empty/dupes while keeping first occurrence.
     """
-    seq: List[str] = []
-    seen = set()
-    for n in list(names or []):
-        s = str(n).strip()
-        if not s or s in seen:
-            continue
-        seen.add(s)
-        seq.append(s)
+    # dict.fromkeys dedupes while keeping first-occurrence order
+    seq: List[str] = list(dict.fromkeys(_name(s) for n in (names or ()) if (s := str(n).strip())))
     WORLD.participants = seq
+    WORLD.participant_set = frozenset(seq)
+    WORLD.participant_src = list(seq)
     WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text="参与者设定：" + (", ".join(seq) if seq else "(无)"))], metadata={"ok": True, "participants": list(seq)})
 
 
+def _participant_set() -> frozenset:
+    """Return the participants membership set, rebuilding it if the list was edited in place."""
+    parts = WORLD.participants
+    # Full list compare (C-level) so same-size edits such as participants[i] = x are caught too
+    if WORLD.participant_src != parts:
+        WORLD.participant_set = frozenset(parts)
+        WORLD.participant_src = list(parts)
+    return WORLD.participant_set
+
+
 def set_character_meta(
     name: str,
     *,
@@ -1441,7 +1656,7 @@ def set_character_meta(
 
     These fields live with the character sheet for agent prompting purposes.
     """
-    nm = str(name)
+    nm = _name(name)
     sheet = WORLD.characters.setdefault(nm, {})
     if persona is not None:
         p = str(persona).strip()
@@ -1500,7 +1715,7 @@ def change_relation(a: str, b: str, delta: int, reason: str = ""):
         dict: { ok: bool, pair: [str,str], score: int, reason: str }
     """
     k = _rel_key(a, b)
-    WORLD.relations[k] = WORLD.relations.get(k, 0) + int(delta)
+    _set_relation_score(k, WORLD.relations.get(k, 0) + int(delta))
     WORLD._touch()
     res = {"ok": True, "pair": list(k), "score": WORLD.relations[k], "reason": reason}
     return ToolResponse(
@@ -1509,9 +1724,14 @@ def change_relation(a: str, b: str, delta: int, reason: str = ""):
     )
 
 
+def _set_relation_score(k: Tuple[str, str], score: int) -> None:
+    """Store a relation score as an int."""
+    WORLD.relations[k] = int(score)
+
+
 def set_relation(a: str, b: str, value: int, reason: str = "初始化") -> ToolResponse:
     k = _rel_key(a, b)
-    WORLD.relations[k] = int(value)
+    _set_relation_score(k, int(value))
     WORLD._touch()
     res = {"ok": True, "pair": list(k), "score": WORLD.relations[k], "reason": reason}
     return ToolResponse(
@@ -1531,7 +1751,7 @@ def grant_item(target: str, item: str, n: int = 1):
     Returns:
         dict: { ok: bool, target: str, item: str, count: int }
     """
-    bag = WORLD.inventory.setdefault(target, {})
+    bag = WORLD.inventory.setdefault(_name(target), {})
     bag[item] = bag.get(item, 0) + int(n)
     WORLD._touch()
     res = {"ok": True, "target": target, "item": item, "count": bag[item]}
@@ -1542,11 +1762,15 @@ def grant_item(target: str, item: str, n: int = 1):
 
 
 def set_position(name: str, x: int, y: int) -> ToolResponse:
-    """Set or update the grid position of an actor."""
+    """Set or update the grid position of an actor.
+
+    This is the ingest point that keeps WORLD.positions values canonical
+    (int, int) tuples; readers rely on that and do not re-check shapes.
+    """
     # Note: position can still be updated externally (e.g., shove/push). We do not
     # block here for dying/dead, because forced movement is allowed. Voluntary
     # movement is gated in move_towards().
-    WORLD.positions[str(name)] = (int(x), int(y))
+    _place(_name(name), (int(x), int(y)))
     WORLD._touch()
     return ToolResponse(
         content=[TextBlock(type="text", text=f"设定 {name} 位置 -> ({int(x)}, {int(y)})")],
@@ -1571,6 +1795,7 @@ def set_guard(guardian: str, protectee: str) -> ToolResponse:
     lst = WORLD.guardians.setdefault(p, [])
     if g not in lst:
         lst.append(g)
+        WORLD.guardian_index.setdefault(g, set()).add(p)
         WORLD._touch()
     return ToolResponse(
         content=[TextBlock(type="text", text=f"守护：{g} -> {p}")],
@@ -1592,40 +1817,46 @@ def clear_guard(guardian: Optional[str] = None, protectee: Optional[str] = None)
     if g is None and p is None:
         changed = sum(len(v) for v in WORLD.guardians.values())
         WORLD.guardians.clear()
+        WORLD.guardian_index.clear()
         WORLD._touch()
         return ToolResponse(content=[TextBlock(type="text", text=f"已清空所有守护关系（{changed} 条）")], metadata={"ok": True, "cleared": changed})
     if p is not None and g is None:
         lst = WORLD.guardians.pop(p, [])
         changed = len(lst)
+        for x in lst:
+            prot = WORLD.guardian_index.get(x)
+            if prot is not None:
+                prot.discard(p)
         if changed:
             WORLD._touch()
         return ToolResponse(content=[TextBlock(type="text", text=f"已清除 {p} 的全部守护（{changed} 名）")], metadata={"ok": True, "protectee": p, "cleared": changed})
     if g is not None and p is None:
         removed = 0
-        for key in list(WORLD.guardians.keys()):
-            lst = WORLD.guardians.get(key, [])
-            if not lst:
+        for key in WORLD.guardian_index.pop(g, ()):
+            lst = WORLD.guardians.get(key)
+            if not lst or g not in lst:
                 continue
-            if g in lst:
-                lst = [x for x in lst if x != g]
-                removed += 1
-                if lst:
-                    WORLD.guardians[key] = lst
-                else:
-                    WORLD.guardians.pop(key, None)
+            lst.remove(g)  # set_guard keeps lists duplicate-free
+            removed += 1
+            if not lst:
+                del WORLD.guardians[key]
         if removed:
             WORLD._touch()
         return ToolResponse(content=[TextBlock(type="text", text=f"已将 {g} 从所有守护中移除（涉及 {removed} 名被保护者）")], metadata={"ok": True, "guardian": g, "affected": removed})
     # both provided
-    lst = WORLD.guardians.get(p, [])
-    if g in lst:
-        lst = [x for x in lst if x != g]
-        if lst:
-            WORLD.guardians[p] = lst
-        else:
+    lst = WORLD.guardians.get(p)
+    if lst:
+        try:
+            lst.remove(g)
+            changed = 1
+        except ValueError:
+            pass
+        if not lst:
             WORLD.guardians.pop(p, None)
-        changed = 1
     if changed:
+        prot = WORLD.guardian_index.get(g)
+        if prot is not None:
+            prot.discard(p)
         WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"已移除守护：{g} -> {p}")], metadata={"ok": True, "removed": changed, "protectee": p, "guardian": g})
 
@@ -1671,19 +1902,24 @@ def get_distance_steps_between(name_a: str, name_b: str) -> Optional[int]:
 
     Minimal multi-scene rule: distance is only defined within the same scene.
     """
+    # Names are normally str already; only coerce the odd non-str caller
+    a = name_a if type(name_a) is str else str(name_a)
+    b = name_b if type(name_b) is str else str(name_b)
+    positions = WORLD.positions
+    pa = positions.get(a)
+    if pa is None:
+        return None
+    pb = positions.get(b)
+    if pb is None:
+        return None
     # Cross-scene: undefined distance
-    try:
-        sa = WORLD.scene_of.get(str(name_a))
-        sb = WORLD.scene_of.get(str(name_b))
+    scene_of = WORLD.scene_of
+    if scene_of:
+        sa = scene_of.get(a)
+        sb = scene_of.get(b)
         if sa is not None and sb is not None and str(sa) != str(sb):
             return None
-    except Exception:
-        pass
-    pa = WORLD.positions.get(str(name_a))
-    pb = WORLD.positions.get(str(name_b))
-    if pa is None or pb is None:
-        return None
-    return _grid_distance(pa, pb)
+    return abs(pa[0] - pb[0]) + abs(pa[1] - pb[1])
 
 
 ## Legacy L∞ helper removed: use get_distance_steps_between (Manhattan) instead.
@@ -1692,6 +1928,11 @@ def get_distance_steps_between(name_a: str, name_b: str) -> Optional[int]:
 # Removed meter-based distance helper; use steps only (get_distance_steps_between).
 
 
+def _spend_reaction(name: str) -> bool:
+    resp = use_action(str(name), "reaction")
+    return bool((resp.metadata or {}).get("ok", False))
+
+
 def _resolve_guard_interception(attacker: str, defender: str, reach_steps: int) -> tuple[str, Optional[Dict[str, Any]], List[TextBlock]]:
     """Resolve protection interception.
 
@@ -1707,44 +1948,70 @@ def _resolve_guard_interception(attacker: str, defender: str, reach_steps: int)
     Returns: (final_defender, guard_meta or None, pre_logs)
     """
     protectee = str(defender)
-    guardians = list(WORLD.guardians.get(protectee, []) or [])
+    # set_guard stores guardian names as str, and nothing below mutates the list
+    guardians = WORLD.guardians.get(protectee)
     if not guardians:
         return defender, None, []
 
+    # Bind containers and the fixed endpoints once; distances are computed inline
+    # with the same same-scene rule as get_distance_steps_between().
+    positions = WORLD.positions
+    turn_state = WORLD.turn_state
+    scene_of = WORLD.scene_of
+    att = str(attacker)
+    pa = positions.get(att)
+    pp = positions.get(protectee)
+    if pa is None or pp is None:
+        return defender, None, []
+    sc_a = scene_of.get(att)
+    sc_p = scene_of.get(protectee)
+    reach = int(reach_steps)
+
     # Build candidate list with computed distances
     cand = []  # (distance_attacker_to_guardian, order_index, guardian)
     for idx, g in enumerate(guardians):
-        g = str(g)
-        # must be alive
-        if not _is_alive(g):
+        # Spatial filters first: they only touch coordinates, so guardians that
+        # are out of position are dropped before any sheet/turn-state lookups.
+        pg = positions.get(g)
+        if pg is None:
             continue
         # adjacency to protectee (Manhattan distance)
-        d_gp = get_distance_steps_between(g, protectee)
-        if d_gp is None or d_gp > 1:
-            continue
-        # reaction available
-        st = WORLD.turn_state.get(g, {})
-        if not st.get("reaction_available", True):
+        if abs(pg[0] - pp[0]) + abs(pg[1] - pp[1]) > 1:
             continue
         # attacker must be within reach vs guardian as well (Manhattan)
-        d_ag = get_distance_steps_between(attacker, g)
-        if d_ag is None or d_ag > int(reach_steps):
+        d_ag = abs(pa[0] - pg[0]) + abs(pa[1] - pg[1])
+        if d_ag > reach:
             continue
-        cand.append((int(d_ag), idx, g))
+        sc_g = scene_of.get(g)
+        if sc_g is not None and ((sc_p is not None and sc_g != sc_p) or (sc_a is not None and sc_g != sc_a)):
+            continue
+        # must be alive
+        if not _is_alive(g):
+            continue
+        # reaction available
+        st = turn_state.get(g)
+        if st and not st.get("reaction_available", True):
+            continue
+        cand.append((d_ag, idx, g))
 
     if not cand:
         return defender, None, []
 
-    # choose by nearest to attacker (ascending), tiebreaker by registration order (ascending idx)
-    cand.sort(key=lambda t: (t[0], t[1]))
+    # choose by nearest to attacker (ascending), tiebreaker by registration order (ascending idx).
+    # Try the minimum first; the remaining candidates are only ordered if it cannot react.
+    # (d, idx) pairs are unique per candidate, so plain tuple order matches the rule.
+    best = min(cand)
     chosen = None
-    for _, _, g in cand:
-        # spend reaction; if cannot, try next
-        resp = use_action(str(g), "reaction")
-        ok = bool((resp.metadata or {}).get("ok", False))
-        if ok:
-            chosen = str(g)
-            break
+    if _spend_reaction(best[2]):
+        chosen = best[2]
+    else:
+        cand.remove(best)
+        cand.sort()
+        for _, _, g in cand:
+            # spend reaction; if cannot, try next
+            if _spend_reaction(g):
+                chosen = g
+                break
     if not chosen:
         return defender, None, []
 
@@ -1784,6 +2051,50 @@ def get_move_speed_steps(name: str) -> int:
     return int(WORLD.speeds.get(name, _default_move_steps()))
 
 
+# CoC 7e characteristic names (upper-case, as stored on sheets)
+_COC_CHAR_KEYS = frozenset({"STR", "CON", "DEX", "INT", "POW", "APP", "EDU", "SIZ", "LUCK"})
+
+# Shared read-only stand-in for a missing sheet/sub-dict
+_EMPTY_DICT: Mapping[str, Any] = MappingProxyType({})
+
+
+def _coc_block(name: str) -> Mapping[str, Any]:
+    """Read-only access to `name`'s CoC block: the live dict (not a copy), or an empty mapping."""
+    st = WORLD.characters.get(name)
+    coc = st.get("coc") if st else None
+    return coc if isinstance(coc, dict) else _EMPTY_DICT
+
+
+def _char_stat(raw: Dict[str, Any], key: str, default: int = 50) -> int:
+    """Read one characteristic by upper-case key without normalizing the whole block.
+
+    Sheets written by set_coc_character already use upper-case keys; other
+    casings are matched case-insensitively as a fallback.
+    """
+    v = raw.get(key)
+    if v is None:
+        v = default
+        for k, val in raw.items():
+            if str(k).upper() == key:
+                v = val
+    return int(v)
+
+
+# MOV (7/8/9 under the rule below) -> clamp(round(MOV / 1.5), 3, 10)
+_MOV_TO_STEPS: Dict[int, int] = {7: 5, 8: 5, 9: 6}
+
+
+@lru_cache(maxsize=4096)
+def _coc_mov_steps(dex: int, str_v: int, siz: int) -> Tuple[int, int]:
+    """CoC 7e MOV and clamped steps/turn for a (DEX, STR, SIZ) triple."""
+    mov = 8
+    if dex > siz and str_v > siz:
+        mov = 9
+    elif dex < siz and str_v < siz:
+        mov = 7
+    return mov, _MOV_TO_STEPS[mov]
+
+
 def derive_move_speed_steps(name: str) -> ToolResponse:
     """按 CoC 7e 规则从角色数值派生移动力（步/回合），并写入缓存。
 
@@ -1796,23 +2107,14 @@ def derive_move_speed_steps(name: str) -> ToolResponse:
     nm = str(name)
     st = WORLD.characters.setdefault(nm, {})
     coc = dict(st.get("coc") or {})
-    ch = {k.upper(): int(v) for k, v in (coc.get("characteristics") or {}).items()}
-    if not ch:
+    raw = coc.get("characteristics") or {}
+    if not raw:
         # 无 CoC 面板时不做其他回退，直接报错信息
         return ToolResponse(
             content=[TextBlock(type="text", text=f"速度派生失败：{nm} 缺少 CoC 特性（characteristics）")],
             metadata={"ok": False, "error_type": "no_coc_characteristics", "name": nm},
         )
-    dex = int(ch.get("DEX", 50))
-    str_v = int(ch.get("STR", 50))
-    siz = int(ch.get("SIZ", 50))
-    mov = 8
-    if dex > siz and str_v > siz:
-        mov = 9
-    elif dex < siz and str_v < siz:
-        mov = 7
-    steps_calc = int(round(float(mov) / 1.5))
-    steps = max(3, min(10, steps_calc))
+    mov, steps = _coc_mov_steps(_char_stat(raw, "DEX"), _char_stat(raw, "STR"), _char_stat(raw, "SIZ"))
     # Persist into CoC derived block for transparency
     try:
         derived = dict((coc.get("derived") or {}))
@@ -1834,7 +2136,12 @@ def derive_all_speeds_from_stats() -> ToolResponse:
     """按 CoC 方案为所有已知角色重算并缓存步数，返回汇总。"""
     content: List[TextBlock] = []
     out_map: Dict[str, int] = {}
-    for nm in list(WORLD.characters.keys()):
+    for nm, st in list(WORLD.characters.items()):
+        coc = st.get("coc") if isinstance(st, dict) else None
+        if not (isinstance(coc, dict) and coc.get("characteristics")):
+            # 无 CoC 面板：不派生，仅汇报当前步数
+            out_map[nm] = get_move_speed_steps(nm)
+            continue
         try:
             res = derive_move_speed_steps(nm)
             if res and isinstance(res.metadata, dict):
@@ -1872,15 +2179,17 @@ def move_towards(name: str, target: Tuple[int, int], steps: Optional[int] = None
       movement for the turn is reduced accordingly.
     - Voluntary movement is blocked for dying/dead actors (unchanged behavior).
     """
-    if WORLD.participants and str(name) not in WORLD.participants:
-        pos = WORLD.positions.get(str(name)) or (0, 0)
+    key = str(name)
+    positions = WORLD.positions
+    if WORLD.participants and key not in _participant_set():
+        pos = positions.get(key) or (0, 0)
         return ToolResponse(
             content=[TextBlock(type="text", text=f"参与者限制：仅当前场景参与者可主动移动。")],
             metadata={"ok": False, "moved": 0, "position": list(pos), "error_type": "not_participant"},
         )
     # Gate voluntary movement by system/control statuses
-    pos = WORLD.positions.get(str(name)) or (0, 0)
-    blocked, msg = _blocked_action(str(name), "move")
+    pos = positions.get(key) or (0, 0)
+    blocked, msg = _blocked_action(key, "move")
     if blocked:
         return ToolResponse(
             content=[TextBlock(type="text", text=msg)],
@@ -1890,14 +2199,13 @@ def move_towards(name: str, target: Tuple[int, int], steps: Optional[int] = None
                 "moved": 0,
                 "position": list(pos),
                 "blocked": True,
-                "actor": str(name),
+                "actor": key,
             },
         )
     # Determine how many steps are allowed for this move
-    nm = str(name)
-    ts = WORLD.turn_state.setdefault(nm, {})
+    ts = WORLD.turn_state.setdefault(key, {})
     try:
-        default_steps = int(WORLD.speeds.get(nm, _default_move_steps()))
+        default_steps = int(WORLD.speeds.get(key, _default_move_steps()))
     except Exception:
         default_steps = _default_move_steps()
     try:
@@ -1914,24 +2222,24 @@ def move_towards(name: str, target: Tuple[int, int], steps: Optional[int] = None
             steps_eff = 0
     steps = max(0, int(min(max(0, steps_eff), max(0, left))))
     if steps == 0:
-        pos = WORLD.positions.get(str(name)) or (0, 0)
         return ToolResponse(
             content=[TextBlock(type="text", text=f"{name} 保持在 ({pos[0]}, {pos[1]})，未移动。")],
             metadata={"ok": True, "moved": 0, "position": list(pos)},
         )
-    current = WORLD.positions.get(str(name))
+    current = positions.get(key)
     if current is None:
-        current = WORLD.positions[str(name)] = (0, 0)
+        current = (0, 0)
+        _place(key, current)
     x, y = current
     tx, ty = int(target[0]), int(target[1])
-    moved = 0
-    while moved < steps and (x, y) != (tx, ty):
-        if x != tx:
-            x += 1 if tx > x else -1
-        elif y != ty:
-            y += 1 if ty > y else -1
-        moved += 1
-    WORLD.positions[str(name)] = (x, y)
+    # Same path as stepping one cell at a time (x axis first, then y), in O(1)
+    dx, dy = tx - x, ty - y
+    sx = min(steps, abs(dx))
+    x += sx if dx > 0 else -sx
+    sy = min(steps - sx, abs(dy))
+    y += sy if dy > 0 else -sy
+    moved = sx + sy
+    _place(key, (x, y))
     # Deduct movement for this turn
     try:
         st_left = int(ts.get("move_left", default_steps))
@@ -2042,15 +2350,18 @@ def add_objective(obj: str):
     name = str(obj)
     WORLD.objectives.append(name)
     WORLD.objective_status[name] = WORLD.objective_status.get(name, "pending")
+    WORLD._touch()
     text = f"新增目标：{name}"
     return ToolResponse(content=[TextBlock(type="text", text=text)], metadata={"objectives": list(WORLD.objectives), "status": dict(WORLD.objective_status)})
 
 
 def _coc_dex_of(name: str) -> int:
-    st = WORLD.characters.get(name, {})
-    coc = dict(st.get("coc") or {})
+    # Read-only probe: no copies of the sheet
+    ch = _coc_block(name).get("characteristics")
+    if not isinstance(ch, dict):
+        return 50
     try:
-        return int((coc.get("characteristics") or {}).get("DEX", 50))
+        return int(ch.get("DEX", 50))
     except Exception:
         return 50
 
@@ -2087,10 +2398,12 @@ def compute_action_order(participants: Optional[List[str]] = None, policy: str =
 
     scores: Dict[str, int] = {}
     if str(policy).lower() == "dex":
-        for nm in names:
-            scores[nm] = _coc_dex_of(nm)
-        # Deterministic: sort by (DEX desc, name asc)
-        ordered = sorted(names, key=lambda n: (scores.get(n, 0), str(n)), reverse=True)
+        # One pass builds plain sort tuples (no key lambda); -i keeps the stable
+        # order of equal entries under reverse=True and never compares names raw.
+        keyed = [(_coc_dex_of(nm), str(nm), -i, nm) for i, nm in enumerate(names)]
+        scores = {k[3]: k[0] for k in keyed}
+        keyed.sort(reverse=True)
+        ordered = [k[3] for k in keyed]
     else:
         # Unknown policy -> fallback to name order
         for nm in names:
@@ -2247,13 +2560,12 @@ def _is_alive(name: Optional[str]) -> bool:
     """
     if not name:
         return False
-    try:
-        st = WORLD.characters.get(str(name), {})
-        hp = int(st.get("hp", 1))
-        return hp > 0
-    except Exception:
-        # Be permissive; if we cannot determine, assume alive
+    st = WORLD.characters.get(str(name))
+    if not st:
         return True
+    hp = _safe_int(st.get("hp", 1))
+    # Be permissive; if we cannot determine, assume alive
+    return hp is None or hp > 0
 
 
 def _is_dying(name: Optional[str]) -> bool:
@@ -2270,15 +2582,19 @@ def _reset_turn_tokens_for(name: Optional[str]):
     if not name:
         return
     spd = int(WORLD.speeds.get(name, _default_move_steps()))
-    WORLD.turn_state[name] = {
-        "action_used": False,
-        "bonus_used": False,
-        "reaction_available": True,
-        "move_left": spd,
-        "disengage": False,
-        "help_target": None,
-        "ready": None,  # {trigger: str, action: dict}
-    }
+    # Reset in place so an actor cycling through rounds keeps one dict
+    ts = WORLD.turn_state.get(name)
+    if ts is None:
+        ts = WORLD.turn_state[name] = {}
+    else:
+        ts.clear()
+    ts["action_used"] = False
+    ts["bonus_used"] = False
+    ts["reaction_available"] = True
+    ts["move_left"] = spd
+    ts["disengage"] = False
+    ts["help_target"] = None
+    ts["ready"] = None  # {trigger: str, action: dict}
     # Note: legacy 'dodge' condition/token removed; no per-turn cleanup needed.
 
 
@@ -2296,7 +2612,8 @@ def reset_actor_turn(name: str) -> ToolResponse:
     """
     nm = str(name)
     _reset_turn_tokens_for(nm)
-    st = dict(WORLD.turn_state.get(nm, {}))
+    # Snapshot, not a reference: the turn_state dict is reused in place across rounds
+    st = dict(WORLD.turn_state.get(nm) or {})
     WORLD._touch()
     return ToolResponse(
         content=[TextBlock(type="text", text=f"[系统] {nm} 回合资源重置")],
@@ -2304,28 +2621,27 @@ def reset_actor_turn(name: str) -> ToolResponse:
     )
 
 
+# use_action kinds: token key, value meaning "spent", message when spent, label when used.
+# A missing key counts as available.
+_ACTION_KEYS: Dict[str, Tuple[str, bool, str, str]] = {
+    "action": ("action_used", True, "本回合动作已用完", "动作"),
+    "bonus": ("bonus_used", True, "本回合附赠动作已用完", "附赠动作"),
+    "reaction": ("reaction_available", False, "本轮反应不可用", "反应"),
+}
+
+
 def use_action(name: str, kind: str = "action") -> ToolResponse:
+    spec = _ACTION_KEYS.get(kind)
+    if spec is None:
+        return ToolResponse(content=[TextBlock(type="text", text=f"未知动作类型 {kind}")], metadata={"ok": False, "error_type": "unknown_action"})
+    key, spent, spent_msg, label = spec
     nm = str(name)
     st = WORLD.turn_state.setdefault(nm, {})
-    if kind == "action":
-        if st.get("action_used"):
-            return ToolResponse(content=[TextBlock(type="text", text=f"[已用] {nm} 本回合动作已用完")], metadata={"ok": False, "error_type": "resource_spent", "kind": kind})
-        st["action_used"] = True
-        WORLD._touch()
-        return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 使用 动作")], metadata={"ok": True})
-    if kind == "bonus":
-        if st.get("bonus_used"):
-            return ToolResponse(content=[TextBlock(type="text", text=f"[已用] {nm} 本回合附赠动作已用完")], metadata={"ok": False, "error_type": "resource_spent", "kind": kind})
-        st["bonus_used"] = True
-        WORLD._touch()
-        return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 使用 附赠动作")], metadata={"ok": True})
-    if kind == "reaction":
-        if not st.get("reaction_available", True):
-            return ToolResponse(content=[TextBlock(type="text", text=f"[已用] {nm} 本轮反应不可用")], metadata={"ok": False, "error_type": "resource_spent", "kind": kind})
-        st["reaction_available"] = False
-        WORLD._touch()
-        return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 使用 反应")], metadata={"ok": True})
-    return ToolResponse(content=[TextBlock(type="text", text=f"未知动作类型 {kind}")], metadata={"ok": False, "error_type": "unknown_action"})
+    if bool(st.get(key, not spent)) == spent:
+        return ToolResponse(content=[TextBlock(type="text", text=f"[已用] {nm} {spent_msg}")], metadata={"ok": False, "error_type": "resource_spent", "kind": kind})
+    st[key] = spent
+    WORLD._touch()
+    return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 使用 {label}")], metadata={"ok": True})
 
 
 def consume_movement(name: str, distance_steps: float) -> ToolResponse:
@@ -2360,11 +2676,15 @@ def consume_movement(name: str, distance_steps: float) -> ToolResponse:
 """Range band system removed: engaged/near/far/long not maintained nor exposed."""
 
 
+_COVER_LEVELS = frozenset({"none", "half", "three_quarters", "total"})
+
+
 def set_cover(name: str, level: str):
     level = str(level)
-    if level not in ("none", "half", "three_quarters", "total"):
+    if level not in _COVER_LEVELS:
         return ToolResponse(content=[TextBlock(type="text", text=f"未知掩体等级 {level}")], metadata={"ok": False, "error_type": "invalid_value", "param": "level", "value": level})
     WORLD.cover[str(name)] = level
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"掩体：{name} -> {level}")], metadata={"ok": True, "name": name, "cover": level})
 
 
@@ -2381,13 +2701,13 @@ def _statuses_for(name: str) -> Dict[str, Dict[str, Any]]:
     - remaining: number of actor-turn ticks left; None means indefinite
     """
     # Reuse WORLD.conditions container for compatibility, but store structured entries.
-    d = WORLD.conditions.setdefault(str(name), set())
-    # If legacy set encountered, convert to empty dict (we no longer use string-sets)
-    if isinstance(d, set):
-        WORLD.conditions[str(name)] = {}
-    if not isinstance(WORLD.conditions.get(str(name)), dict):
-        WORLD.conditions[str(name)] = {}
-    return WORLD.conditions[str(name)]  # type: ignore[return-value]
+    # Only this function writes entries, so after the first call the value is a dict.
+    key = str(name)
+    d = WORLD.conditions.get(key)
+    if type(d) is not dict:
+        # Missing, or a legacy string-set: start a fresh structured dict
+        d = WORLD.conditions[key] = {}
+    return d
 
 
 def add_status(name: str, state: str, *, duration_rounds: Optional[int] = None, kind: str = "control", source: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> ToolResponse:
@@ -2398,6 +2718,7 @@ def add_status(name: str, state: str, *, duration_rounds: Optional[int] = None,
         "source": (str(source) if source is not None else None),
         "data": dict(data or {}),
     }
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"状态：{name} +{state}{f'（{duration_rounds}轮）' if duration_rounds else ''}")], metadata={"ok": True, "name": name, "state": state, "remaining": st[str(state)]["remaining"], "kind": kind})
 
 
@@ -2405,16 +2726,31 @@ def remove_status(name: str, state: str) -> ToolResponse:
     st = _statuses_for(str(name))
     if str(state) in st:
         st.pop(str(state), None)
+        WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"状态：{name} -{state}")], metadata={"ok": True, "name": name, "state": state})
 
 
+def _safe_status_op(fn, *args, **kwargs) -> Optional[ToolResponse]:
+    """Run a status mutator for bookkeeping; failures are swallowed (returns None).
+
+    The status writers bump WORLD.version themselves; wrap batches in bulk_update().
+    """
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        return None
+
+
 def has_status(name: str, state: str) -> bool:
-    st = _statuses_for(str(name))
-    return str(state) in st
+    # Read-only probe: never creates or migrates the actor's entry
+    d = WORLD.conditions.get(str(name))
+    return isinstance(d, dict) and str(state) in d
 
 
 def list_statuses(name: str) -> Dict[str, Dict[str, Any]]:
-    return dict(_statuses_for(str(name)))
+    """Return a copy of `name`'s statuses; always a dict (empty when none), never None."""
+    d = WORLD.conditions.get(str(name))
+    return dict(d) if isinstance(d, dict) else {}
 
 
 def _tick_control_statuses(name: str) -> List[TextBlock]:
@@ -2423,6 +2759,9 @@ def _tick_control_statuses(name: str) -> List[TextBlock]:
     Returns a list of text blocks describing expirations.
     """
     out: List[TextBlock] = []
+    if not WORLD.conditions.get(str(name)):
+        # Common case: no statuses at all, nothing to tick
+        return out
     st = _statuses_for(str(name))
     expired: List[str] = []
     for k, info in list(st.items()):
@@ -2445,65 +2784,78 @@ def _tick_control_statuses(name: str) -> List[TextBlock]:
     return out
 
 
-def _blocked_action(name: str, action: str) -> Tuple[bool, str]:
-    """Return (blocked, message) if `name` cannot perform `action`.
-
-    Actions: 'move' | 'attack' | 'cast' | 'dash' | 'disengage' | 'help' | 'first_aid' | 'action'
-    """
-    nm = str(name)
-    act = str(action)
-    # System gating: dying/dead
+def _gather_block_context(nm: str) -> Tuple[int, bool, Dict[str, Any]]:
+    """Read everything the action gate needs for `nm` once: (hp_now, dying, statuses)."""
     st = WORLD.characters.get(nm, {})
-    try:
-        hp_now = int(st.get("hp", 0)) if st else 0
-    except Exception:
-        hp_now = 0
-    if st.get("dying_turns_left") is not None:
+    hp_now = _safe_int(st.get("hp"), 0) if st else 0
+    dying = st.get("dying_turns_left") is not None
+    # Read-only probe; list_statuses() would copy (and create) the entry
+    sts = WORLD.conditions.get(nm)
+    if not isinstance(sts, dict):
+        sts = {}
+    return hp_now, dying, sts
+
+
+def _eval_blocked(nm: str, ctx: Tuple[int, bool, Dict[str, Any]], act: str) -> Tuple[bool, str]:
+    """Apply the dying/down and control-status rules to one action."""
+    hp_now, dying, sts = ctx
+    # Label shared by every blocked message below
+    lab = _ACTION_LABEL.get(act, "行动")
+    if dying:
         # Block specific actions with tailored message
-        lab = _ACTION_LABEL.get(act, "行动")
         # Dying: block move/attack/cast by design
-        if act in ("move", "attack", "cast", "dash", "disengage", "action"):
+        if act in _DYING_BLOCKED_ACTS:
             return True, f"{nm} 处于濒死状态，无法{lab}。"
     if hp_now <= 0:
-        if act in ("move", "attack", "cast", "dash", "disengage", "action"):
-            lab = _ACTION_LABEL.get(act, "行动")
+        if act in _DYING_BLOCKED_ACTS:
             return True, f"{nm} 已倒地，无法{lab}。"
-    # Control gating: check unified statuses
-    try:
-        sts = list_statuses(nm)
-    except Exception:
-        sts = {}
-    for k, info in (sts or {}).items():
-        rule = CONTROL_STATUS_RULES.get(str(k).lower())
-        if not rule:
-            continue
-        blocks = set(rule.get("blocks", set()))
-        if "all" in blocks or act in blocks or (act != "move" and "action" in blocks):
-            lab = _ACTION_LABEL.get(act, "行动")
+    # Control gating: check unified statuses against the action's block mask
+    mask = _block_mask_for(act)
+    for k in sts:
+        bit = CONDITION_BITS.get(k)
+        if bit is None:
+            bit = CONDITION_BITS.get(str(k).lower(), 0)
+        if bit & mask:
             return True, f"{nm} 处于{k}状态，无法{lab}。"
     return False, ""
 
 
+def _blocked_action(name: str, action: str) -> Tuple[bool, str]:
+    """Return (blocked, message) if `name` cannot perform `action`.
+
+    Actions: 'move' | 'attack' | 'cast' | 'dash' | 'disengage' | 'help' | 'first_aid' | 'action'
+    """
+    nm = str(name)
+    return _eval_blocked(nm, _gather_block_context(nm), str(action))
+
+
 def get_action_restrictions(name: str) -> Dict[str, bool]:
     """Return a dict of action -> blocked for the given actor.
 
     Keys: move, attack, cast, action
     """
-    out = {}
-    for act in ("move", "attack", "cast", "action"):
-        b, _ = _blocked_action(str(name), act)
-        out[act] = bool(b)
-    return out
+    nm = str(name)
+    ctx = _gather_block_context(nm)
+    return {act: _eval_blocked(nm, ctx, act)[0] for act in ("move", "attack", "cast", "action")}
 
 
-def queue_trigger(kind: str, payload: Optional[Dict[str, Any]] = None):
-    WORLD.triggers.append({"kind": str(kind), "payload": dict(payload or {})})
+def queue_trigger(kind: str, payload: Optional[Dict[str, Any]] = None, *, copy: bool = True):
+    """Enqueue a trigger. Pass copy=False only when the caller hands over ownership of `payload`."""
+    if payload is None:
+        p: Dict[str, Any] = {}
+    elif copy or type(payload) is not dict:
+        p = dict(payload or {})
+    else:
+        p = payload
+    WORLD.triggers.append({"kind": str(kind), "payload": p})
     return ToolResponse(content=[TextBlock(type="text", text=f"触发：{kind}")], metadata={"queued": len(WORLD.triggers)})
 
 
 def pop_triggers() -> List[Dict[str, Any]]:
-    out = list(WORLD.triggers)
-    WORLD.triggers.clear()
+    # Hand the queued list to the caller and start a fresh one (no copy);
+    # nothing else keeps a reference to WORLD.triggers.
+    out = WORLD.triggers
+    WORLD.triggers = []
     return out
 
 
@@ -2529,6 +2881,10 @@ def act_search(name: str, skill: str = "Perception", dc: int = 50):
     return skill_check_coc(str(name), str(skill))
 
 
+# CoC success levels ranked for opposed checks
+_COC_LEVEL_RANK: Dict[str, int] = {"extreme": 3, "hard": 2, "regular": 1, "fail": 0}
+
+
 def contest(a: str, a_skill: str, b: str, b_skill: str) -> ToolResponse:
     """CoC opposed check with dying short-circuit.
 
@@ -2536,11 +2892,12 @@ def contest(a: str, a_skill: str, b: str, b_skill: str) -> ToolResponse:
     - Else compare success levels; tie breaks by lower roll wins; if still tied, defender wins.
     """
     # Dying short-circuit
-    if _is_dying(a) and not _is_dying(b):
+    da, db = _is_dying(a), _is_dying(b)
+    if da and not db:
         return ToolResponse(content=[TextBlock(type="text", text=f"对抗跳过：{a} 濒死，{b} 自动胜")], metadata={"winner": b, "skip_reason": "attacker_dying"})
-    if _is_dying(b) and not _is_dying(a):
+    if db and not da:
         return ToolResponse(content=[TextBlock(type="text", text=f"对抗跳过：{b} 濒死，{a} 自动胜")], metadata={"winner": a, "skip_reason": "defender_dying"})
-    if _is_dying(a) and _is_dying(b):
+    if da and db:
         return ToolResponse(content=[TextBlock(type="text", text=f"对抗跳过：双方均濒死，判 {b} 胜")], metadata={"winner": b, "skip_reason": "both_dying"})
 
     # Regular opposed check
@@ -2548,9 +2905,8 @@ def contest(a: str, a_skill: str, b: str, b_skill: str) -> ToolResponse:
     br = skill_check_coc(b, b_skill)
     a_meta = ar.metadata or {}
     b_meta = br.metadata or {}
-    def _lvl(m):
-        return {"extreme": 3, "hard": 2, "regular": 1, "fail": 0}.get(str(m.get("success_level", "fail")), 0)
-    la, lb = _lvl(a_meta), _lvl(b_meta)
+    la = _COC_LEVEL_RANK.get(str(a_meta.get("success_level", "fail")), 0)
+    lb = _COC_LEVEL_RANK.get(str(b_meta.get("success_level", "fail")), 0)
     if la != lb:
         winner = a if la > lb else b
     else:
@@ -2570,7 +2926,8 @@ def contest(a: str, a_skill: str, b: str, b_skill: str) -> ToolResponse:
 # ---- Character/stat tools ----
 def set_character(name: str, hp: int, max_hp: int):
     """Create/update a character with hp and max_hp."""
-    WORLD.characters[name] = {"hp": int(hp), "max_hp": int(max_hp)}
+    WORLD.characters[_name(name)] = {"hp": int(hp), "max_hp": int(max_hp)}
+    WORLD._touch()
     return ToolResponse(
         content=[TextBlock(type="text", text=f"设定角色 {name}：HP {int(hp)}/{int(max_hp)}")],
         metadata={"name": name, "hp": int(hp), "max_hp": int(max_hp)},
@@ -2578,10 +2935,16 @@ def set_character(name: str, hp: int, max_hp: int):
 
 
 # ================= CoC 7e support (percentile) =================
+@lru_cache(maxsize=256)
+def _coc7_hp_max_pure(con: int, siz: int) -> int:
+    """CoC 7e HP Max for int CON/SIZ: floor((CON + SIZ) / 10), min 1."""
+    return max(1, (max(0, con) + max(0, siz)) // 10)
+
+
 def _coc7_hp_max(con: int, siz: int) -> int:
     """Compute CoC 7e HP Max from percentile CON/SIZ.
 
-    Formula (7e): floor((CON + SIZ) / 10), min 1.
+    Formula (7e): floor((CON + SIZ) / 10), min 1. Non-numeric inputs count as 0.
     """
     try:
         con_i = int(con)
@@ -2591,8 +2954,7 @@ def _coc7_hp_max(con: int, siz: int) -> int:
         siz_i = int(siz)
     except Exception:
         siz_i = 0
-    val = (max(0, con_i) + max(0, siz_i)) // 10
-    return max(1, int(val))
+    return _coc7_hp_max_pure(con_i, siz_i)
 
 
 def set_coc_character(
@@ -2601,18 +2963,24 @@ def set_coc_character(
     characteristics: Dict[str, int],
     skills: Optional[Dict[str, int]] = None,
     terra: Optional[Dict[str, Any]] = None,
+    _prenormalized: bool = False,
 ) -> ToolResponse:
     """Create/update a CoC 7e character and derive HP by CoC 7e rule.
 
     Input characteristics are percentile scores like {STR, CON, DEX, INT, POW, APP, EDU, SIZ, LUCK}.
     HP Max = floor((CON + SIZ) / 10), at least 1. Starts at full HP.
     Also derives basic SAN/MP if POW present; leaves others to callers.
+    `_prenormalized` (internal): characteristics is a fresh dict with upper-case keys
+    and int values owned by the caller; it is stored as-is.
     """
     nm = str(name)
-    char = {k.upper(): int(v) for k, v in (characteristics or {}).items()}
+    if _prenormalized:
+        char = characteristics
+    else:
+        char = {k.upper(): int(v) for k, v in (characteristics or {}).items()}
     con = int(char.get("CON", 0))
     siz = int(char.get("SIZ", 0))
-    hp_max = _coc7_hp_max(con, siz)
+    hp_max = _coc7_hp_max_pure(con, siz)
     # Start at full HP/MP
     hp_now = int(hp_max)
     pow_v = int(char.get("POW", 0))
@@ -2674,7 +3042,7 @@ def recompute_coc_derived(name: str) -> ToolResponse:
     ch = {k.upper(): int(v) for k, v in (coc.get("characteristics") or {}).items()}
     con = int(ch.get("CON", 0))
     siz = int(ch.get("SIZ", 0))
-    hp_max = _coc7_hp_max(con, siz)
+    hp_max = _coc7_hp_max_pure(con, siz)
     # Keep current damage by preserving ratio of current to old max, but clamp to new max.
     try:
         old_max = int(st.get("max_hp", hp_max))
@@ -2724,17 +3092,18 @@ def set_coc_character_from_config(name: str, coc: Dict[str, Any]) -> ToolRespons
     # Extract primary blocks
     chars = d.get("characteristics")
     if not isinstance(chars, dict):
-        # Allow flat layout fallback for ability-like keys
-        chars = {k: v for k, v in d.items() if isinstance(v, (int, float)) and str(k).isupper()}
+        # Allow flat layout fallback for the known characteristic keys
+        chars = {k: v for k, v in d.items() if k in _COC_CHAR_KEYS and isinstance(v, (int, float))}
     skills = d.get("skills") if isinstance(d.get("skills"), dict) else None
     terra = d.get("terra") if isinstance(d.get("terra"), dict) else None
 
     # Create/update the base CoC sheet first
     res = set_coc_character(
         name=name,
-        characteristics={k: int(v) for k, v in (chars or {}).items()},
+        characteristics={str(k).upper(): int(v) for k, v in (chars or {}).items()},
         skills=skills,
         terra=terra,
+        _prenormalized=True,
     )
 
     # Preserve additional fields (e.g., arts_known) under the coc block
@@ -2771,6 +3140,7 @@ def _infection_stage_floor(stage: int) -> int:
 def _ensure_infection_block(name: str) -> Dict[str, Any]:
     """Return normalized infection block for `name`, creating defaults if needed."""
     nm = str(name)
+    created = nm not in WORLD.characters
     st = WORLD.characters.setdefault(nm, {})
     coc = st.setdefault("coc", {})
     terra = coc.setdefault("terra", {})
@@ -2791,10 +3161,14 @@ def _ensure_infection_block(name: str) -> Dict[str, Any]:
     floor = _infection_stage_floor(stage)
     if stress < floor:
         stress = floor
+    # Read paths (get_infection_state) also come through here: only bump the version on real writes
+    changed = created or (inf.get("stage"), inf.get("stress"), inf.get("crystal_density")) != (stage, stress, cd)
     inf.update({"stage": stage, "stress": stress, "crystal_density": cd})
     terra["infection"] = inf
     coc["terra"] = terra
     st["coc"] = coc
+    if changed:
+        WORLD._touch()
     return inf
 
 
@@ -2997,7 +3371,7 @@ def apply_exposure(
             expr = "2d10"
         else:
             expr = "1"
-    roll_res = roll_dice(expr)
+    roll_res = roll_dice(expr, include_breakdown=False)
     raw = int((roll_res.metadata or {}).get("total", 0))
 
     # 2) Infection resist target
@@ -3113,19 +3487,15 @@ def apply_exposure(
                     )
                     # CON 极难检定：非极难视作失败
                     con_chk = skill_check_coc(nm, "CON")
-                    for blk in (con_chk.content or []):
-                        if isinstance(blk, dict) and blk.get("type") == "text":
-                            out_logs.append(blk)
+                    _extend_text_blocks(out_logs, con_chk.content)
                     con_meta = con_chk.metadata or {}
                     con_level = str(con_meta.get("success_level", "fail"))
                     if con_level != "extreme":
-                        dmg_roll = roll_dice("1d6")
+                        dmg_roll = roll_dice("1d6", include_breakdown=False)
                         dmg_raw = int((dmg_roll.metadata or {}).get("total", 0))
                         # arts_barrier 可对这次 HP 伤害减半（物理护甲无效）
                         try:
-                            coc_d = dict(WORLD.characters.get(nm, {}).get("coc") or {})
-                            terra_d = dict(coc_d.get("terra") or {})
-                            prot = dict(terra_d.get("protection") or {})
+                            prot = ((WORLD.characters.get(nm, {}).get("coc") or {}).get("terra") or {}).get("protection") or {}
                             barrier = int(prot.get("arts_barrier", 0))
                         except Exception:
                             barrier = 0
@@ -3140,17 +3510,13 @@ def apply_exposure(
                             )
                         )
                         dmg_res = damage(nm, dmg)
-                        for blk in (dmg_res.content or []):
-                            if isinstance(blk, dict) and blk.get("type") == "text":
-                                out_logs.append(blk)
+                        _extend_text_blocks(out_logs, dmg_res.content)
                     # POW 检定：失败则眩晕 1d3 轮
                     pow_chk = skill_check_coc(nm, "POW")
-                    for blk in (pow_chk.content or []):
-                        if isinstance(blk, dict) and blk.get("type") == "text":
-                            out_logs.append(blk)
+                    _extend_text_blocks(out_logs, pow_chk.content)
                     pow_meta = pow_chk.metadata or {}
                     if not bool(pow_meta.get("success", False)):
-                        turns_roll = roll_dice("1d3")
+                        turns_roll = roll_dice("1d3", include_breakdown=False)
                         turns = int((turns_roll.metadata or {}).get("total", 1))
                         turns = max(1, turns)
                         out_logs.append(
@@ -3161,9 +3527,7 @@ def apply_exposure(
                         )
                         try:
                             st_res = add_status(nm, "stunned", duration_rounds=turns, kind="control")
-                            for blk in (st_res.content or []):
-                                if isinstance(blk, dict) and blk.get("type") == "text":
-                                    out_logs.append(blk)
+                            _extend_text_blocks(out_logs, st_res.content)
                         except Exception:
                             pass
         # 阶段进展：stress>100 或两次重度发作
@@ -3175,9 +3539,7 @@ def apply_exposure(
         final_stress = after
         if (after > 100 or severe_count >= 2) and stage_now < 3:
             adv = advance_infection_stage(nm, choice="auto")
-            for blk in (adv.content or []):
-                if isinstance(blk, dict) and blk.get("type") == "text":
-                    out_logs.append(blk)
+            _extend_text_blocks(out_logs, adv.content)
             meta = adv.metadata or {}
             stage_advanced = bool(meta.get("ok", False))
             # 取更新后的应激值
@@ -3248,16 +3610,14 @@ def _enter_dying(name: str, *, turns: int = DYING_TURNS_DEFAULT) -> ToolResponse
     """
     nm = str(name)
     st = WORLD.characters.setdefault(nm, {"hp": 0, "max_hp": 0})
+    left = int(max(0, turns))
     st["hp"] = 0
-    st["dying_turns_left"] = int(max(0, turns))
+    st["dying_turns_left"] = left
     # Also record a unified 'dying' status for visibility.
-    try:
-        add_status(nm, "dying", duration_rounds=st["dying_turns_left"], kind="system")
-    except Exception:
-        pass
-    note = TextBlock(type="text", text=f"{nm} 进入濒死（{st['dying_turns_left']}回合后死亡；再次受伤即死）")
+    _safe_status_op(add_status, nm, "dying", duration_rounds=left, kind="system")
+    note = _text(f"{nm} 进入濒死（{left}回合后死亡；再次受伤即死）")
     WORLD._touch()
-    return ToolResponse(content=[note], metadata={"ok": True, "name": nm, "dying": True, "turns_left": st["dying_turns_left"]})
+    return ToolResponse(content=[note], metadata={"ok": True, "name": nm, "dying": True, "turns_left": left})
 
 
 def _die(name: str, *, reason: str = "wounds") -> ToolResponse:
@@ -3272,15 +3632,9 @@ def _die(name: str, *, reason: str = "wounds") -> ToolResponse:
         except Exception:
             st["dying_turns_left"] = None
     # Remove unified 'dying' status if present; add a persistent 'dead' status for visibility.
-    try:
-        remove_status(nm, "dying")
-    except Exception:
-        pass
-    try:
-        add_status(nm, "dead", duration_rounds=None, kind="system")
-    except Exception:
-        pass
-    note = TextBlock(type="text", text=f"{nm} 死亡。")
+    _safe_status_op(remove_status, nm, "dying")
+    _safe_status_op(add_status, nm, "dead", duration_rounds=None, kind="system")
+    note = _text(f"{nm} 死亡。")
     WORLD._touch()
     return ToolResponse(content=[note], metadata={"ok": True, "name": nm, "dead": True, "reason": reason})
 
@@ -3301,10 +3655,7 @@ def tick_dying_for(name: str) -> ToolResponse:
     st = WORLD.characters.get(nm, {})
     if not st or st.get("dying_turns_left") is None:
         return ToolResponse(content=[], metadata={"ok": True, "name": nm, "affected": False})
-    try:
-        left = int(st.get("dying_turns_left", 0))
-    except Exception:
-        left = 0
+    left = _safe_int(st.get("dying_turns_left"), 0)
     # Already scheduled to die
     if left <= 0:
         res = _die(nm, reason="timeout")
@@ -3315,7 +3666,7 @@ def tick_dying_for(name: str) -> ToolResponse:
         res = _die(nm, reason="timeout")
         return ToolResponse(content=notes + (res.content or []), metadata=res.metadata)
     # Otherwise, report remaining
-    note = TextBlock(type="text", text=f"{nm} 濒死剩余 {st['dying_turns_left']} 回合。")
+    note = _text(f"{nm} 濒死剩余 {st['dying_turns_left']} 回合。")
     WORLD._touch()
     return ToolResponse(content=notes + [note], metadata={"ok": True, "name": nm, "turns_left": st["dying_turns_left"], "affected": True})
 
@@ -3326,32 +3677,31 @@ def damage(name: str, amount: int):
     st = WORLD.characters.setdefault(nm, {"hp": 0, "max_hp": 0})
     # Mark a new injury instance for First Aid gating
     if amt > 0:
-        try:
-            st["injury_id"] = int(st.get("injury_id", 0)) + 1
-        except Exception:
-            st["injury_id"] = 1
+        st["injury_id"] = _safe_int(st.get("injury_id"), 0) + 1
     hp_before = int(st.get("hp", 0))
     # If already dying, any damage kills immediately
     if st.get("dying_turns_left") is not None:
         die_res = _die(nm, reason="reinjury")
-        parts: List[TextBlock] = [TextBlock(type="text", text=f"{nm} 在濒死状态下再次受到 {amt} 伤害，立即死亡。")]
+        parts: List[TextBlock] = [_text(f"{nm} 在濒死状态下再次受到 {amt} 伤害，立即死亡。")]
         parts.extend(die_res.content or [])
         return ToolResponse(content=parts, metadata={"ok": True, "name": nm, "hp": 0, "max_hp": st.get("max_hp"), "dead": True})
 
     # Apply damage normally
-    st["hp"] = max(0, hp_before - amt)
-    dead_or_down = st["hp"] <= 0
-    parts = [TextBlock(type="text", text=f"{nm} 受到 {amt} 伤害，HP {st['hp']}/{st.get('max_hp', st['hp'])}{'（倒地）' if dead_or_down else ''}")]
+    hp_after = max(0, hp_before - amt)
+    st["hp"] = hp_after
+    max_hp = st.get("max_hp")
+    dead_or_down = hp_after <= 0
+    parts = [_text(f"{nm} 受到 {amt} 伤害，HP {hp_after}/{st.get('max_hp', hp_after)}{'（倒地）' if dead_or_down else ''}")]
     # Transition to dying if this hit reduces to 0
-    if st["hp"] <= 0:
+    if dead_or_down:
         # Enter dying instead of immediate death
         res = _enter_dying(nm, turns=DYING_TURNS_DEFAULT)
         parts.extend(res.content or [])
-        return ToolResponse(content=parts, metadata={"name": nm, "hp": 0, "max_hp": st.get("max_hp"), "dead": True, "dying": True, "turns_left": st.get("dying_turns_left")})
+        return ToolResponse(content=parts, metadata={"name": nm, "hp": 0, "max_hp": max_hp, "dead": True, "dying": True, "turns_left": st.get("dying_turns_left")})
     WORLD._touch()
     return ToolResponse(
         content=parts,
-        metadata={"ok": True, "name": nm, "hp": st["hp"], "max_hp": st.get("max_hp"), "dead": False},
+        metadata={"ok": True, "name": nm, "hp": hp_after, "max_hp": max_hp, "dead": False},
     )
 
 
@@ -3369,7 +3719,7 @@ def first_aid(name: str, target: str) -> ToolResponse:
     blocked, msg = _blocked_action(rescuer, "action")
     if blocked:
         return ToolResponse(
-            content=[TextBlock(type="text", text=msg)],
+            content=[_text(msg)],
             metadata={"ok": False, "error_type": "attacker_unable", "rescuer": rescuer, "target": str(target)}
         )
     tgt = str(target)
@@ -3377,14 +3727,11 @@ def first_aid(name: str, target: str) -> ToolResponse:
     logs: List[TextBlock] = []
     # Skill check
     chk = skill_check_coc(rescuer, "FirstAid")
-    if chk.content:
-        for blk in chk.content:
-            if isinstance(blk, dict) and blk.get("type") == "text":
-                logs.append(blk)
+    _extend_text_blocks(logs, chk.content)
     ok = bool((chk.metadata or {}).get("success"))
     if not ok:
         return ToolResponse(
-            content=logs + [TextBlock(type="text", text=f"{rescuer} 急救失败，{tgt} 状态未变")],
+            content=logs + [_text(f"{rescuer} 急救失败，{tgt} 状态未变")],
             metadata={"ok": False, "error_type": "check_failed", "rescuer": rescuer, "target": tgt}
         )
 
@@ -3392,18 +3739,16 @@ def first_aid(name: str, target: str) -> ToolResponse:
     # If dying: stabilize and set hp to at least 1
     if st.get("dying_turns_left") is not None:
         st["dying_turns_left"] = None
-        try:
-            remove_status(tgt, "dying")
-        except Exception:
-            pass
+        _safe_status_op(remove_status, tgt, "dying")
         # Raise HP to at least 1
         try:
-            st["hp"] = max(1, int(st.get("hp", 0)))
+            new_hp = max(1, int(st.get("hp", 0)))
         except Exception:
-            st["hp"] = 1
-        logs.append(TextBlock(type="text", text=f"{rescuer} 成功稳定 {tgt}（HP 至少 1，脱离濒死）"))
+            new_hp = 1
+        st["hp"] = new_hp
+        logs.append(_text(f"{rescuer} 成功稳定 {tgt}（HP 至少 1，脱离濒死）"))
         WORLD._touch()
-        return ToolResponse(content=logs, metadata={"ok": True, "rescuer": rescuer, "target": tgt, "stabilized": True, "hp": st.get("hp")})
+        return ToolResponse(content=logs, metadata={"ok": True, "rescuer": rescuer, "target": tgt, "stabilized": True, "hp": new_hp})
 
     # Non-dying healing: +1 HP once per injury
     try:
@@ -3416,16 +3761,17 @@ def first_aid(name: str, target: str) -> ToolResponse:
         injury_id = int(st.get("injury_id", 0))
         applied_on = int(st.get("first_aid_applied_on", -1))
         if applied_on == injury_id and injury_id > 0:
-            logs.append(TextBlock(type="text", text=f"{tgt} 该伤势已急救过（本次不再恢复 HP）"))
+            logs.append(_text(f"{tgt} 该伤势已急救过（本次不再恢复 HP）"))
             return ToolResponse(content=logs, metadata={"ok": True, "rescuer": rescuer, "target": tgt, "healed": 0, "already_applied": True})
-        st["hp"] = min(max_hp, hp + 1)
+        new_hp = min(max_hp, hp + 1)
+        st["hp"] = new_hp
         st["first_aid_applied_on"] = injury_id
-        logs.append(TextBlock(type="text", text=f"{rescuer} 急救成功，{tgt} 恢复 1 点 HP（{st['hp']}/{max_hp}）"))
+        logs.append(_text(f"{rescuer} 急救成功，{tgt} 恢复 1 点 HP（{new_hp}/{max_hp}）"))
         WORLD._touch()
-        return ToolResponse(content=logs, metadata={"ok": True, "rescuer": rescuer, "target": tgt, "healed": 1, "hp": st.get("hp")})
+        return ToolResponse(content=logs, metadata={"ok": True, "rescuer": rescuer, "target": tgt, "healed": 1, "hp": new_hp})
 
     # Otherwise nothing to do
-    logs.append(TextBlock(type="text", text=f"{tgt} 当前无需急救（HP={hp}/{max_hp}）"))
+    logs.append(_text(f"{tgt} 当前无需急救（HP={hp}/{max_hp}）"))
     return ToolResponse(content=logs, metadata={"ok": True, "rescuer": rescuer, "target": tgt, "healed": 0})
 
 
@@ -3434,22 +3780,22 @@ def heal(name: str, amount: int):
     nm = str(name)
     st = WORLD.characters.setdefault(nm, {"hp": 0, "max_hp": 0})
     max_hp = int(st.get("max_hp", 0))
-    st["hp"] = min(max_hp if max_hp > 0 else st.get("hp", 0), int(st.get("hp", 0)) + amt)
-    parts = [TextBlock(type="text", text=f"{nm} 恢复 {amt} 点生命，HP {st['hp']}/{st.get('max_hp', st['hp'])}")]
+    hp_cur = st.get("hp", 0)
+    new_hp = min(max_hp if max_hp > 0 else hp_cur, int(hp_cur) + amt)
+    st["hp"] = new_hp
+    parts = [_text(f"{nm} 恢复 {amt} 点生命，HP {new_hp}/{st.get('max_hp', new_hp)}")]
     # If healed above 0 while dying, clear dying state
-    if st.get("hp", 0) > 0 and st.get("dying_turns_left") is not None:
+    if new_hp > 0 and st.get("dying_turns_left") is not None:
         try:
             st.pop("dying_turns_left", None)
         except Exception:
             st["dying_turns_left"] = None
-        try:
-            remove_status(nm, "dying")
-        except Exception:
-            pass
-        parts.append(TextBlock(type="text", text=f"{nm} 脱离濒死。"))
+        _safe_status_op(remove_status, nm, "dying")
+        parts.append(_text(f"{nm} 脱离濒死。"))
+    WORLD._touch()
     return ToolResponse(
         content=parts,
-        metadata={"name": nm, "hp": st["hp"], "max_hp": st.get("max_hp")},
+        metadata={"name": nm, "hp": new_hp, "max_hp": st.get("max_hp")},
     )
 
 
@@ -3463,8 +3809,10 @@ def spend_mp(name: str, amount: int) -> ToolResponse:
         return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 未消耗 MP")], metadata={"ok": True, "mp": cur, "spent": 0})
     if cur < amt:
         return ToolResponse(content=[TextBlock(type="text", text=f"{nm} MP 不足（需要 {amt}，当前 {cur}）")], metadata={"ok": False, "error_type": "mp_insufficient", "need": amt, "mp": cur})
-    st["mp"] = cur - amt
-    return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 消耗 MP {amt}（剩余 {st['mp']}）")], metadata={"ok": True, "mp": st["mp"], "spent": amt})
+    left = cur - amt
+    st["mp"] = left
+    WORLD._touch()
+    return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 消耗 MP {amt}（剩余 {left}）")], metadata={"ok": True, "mp": left, "spent": amt})
 
 
 def recover_mp(name: str, amount: int) -> ToolResponse:
@@ -3473,18 +3821,16 @@ def recover_mp(name: str, amount: int) -> ToolResponse:
     st = WORLD.characters.setdefault(nm, {})
     cap = int(st.get("max_mp", 0))
     cur = int(st.get("mp", 0))
-    st["mp"] = min(cap if cap > 0 else cur + amt, cur + amt)
-    return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 恢复 MP {amt}（{st['mp']}/{cap or '?'}）")], metadata={"ok": True, "mp": st["mp"], "max_mp": cap})
+    new_mp = min(cap if cap > 0 else cur + amt, cur + amt)
+    st["mp"] = new_mp
+    WORLD._touch()
+    return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 恢复 MP {amt}（{new_mp}/{cap or '?'}）")], metadata={"ok": True, "mp": new_mp, "max_mp": cap})
 
 
 # ---- Dice tools ----
-def roll_dice(expr: str = "1d20"):
-    """Roll dice expression like '1d20+3', '2d6+1', 'd20'."""
-    expr = expr.lower().replace(" ", "")
-    total = 0
-    parts: List[str] = []
-    i = 0
-    sign = 1
+@lru_cache(maxsize=512)
+def _parse_dice(expr: str) -> Tuple[Tuple[int, int, Optional[int]], ...]:
+    """Parse a normalized dice expression into (sign, n, m) terms; m is None for constants."""
     # Simple parser supporting NdM, +/-, and constants
     token = ""
     tokens: List[str] = []
@@ -3498,9 +3844,8 @@ def roll_dice(expr: str = "1d20"):
             token += ch
     if token:
         tokens.append(token)
-    # Evaluate tokens
     sign = 1
-    breakdown: List[str] = []
+    terms: List[Tuple[int, int, Optional[int]]] = []
     for tk in tokens:
         if tk == "+":
             sign = 1
@@ -3512,15 +3857,72 @@ def roll_dice(expr: str = "1d20"):
             n_str, _, m_str = tk.partition("d")
             n = int(n_str) if n_str else 1
             m = int(m_str) if m_str else 20
-            rolls = [random.randint(1, m) for _ in range(max(1, n))]
-            subtotal = sum(rolls) * sign
-            total += subtotal
-            breakdown.append(f"{sign:+d}{n}d{m}({','.join(map(str, rolls))})")
+            terms.append((sign, n, m))
         else:
-            val = sign * int(tk)
-            total += val
-            breakdown.append(f"{val:+d}")
-    text = f"掷骰 {expr} = {total} [{' '.join(breakdown)}]"
+            terms.append((sign, int(tk), None))
+    return tuple(terms)
+
+
+# Most rolls are a single die; these skip the parser entirely (expr -> sides)
+_FAST_DICE: Dict[str, int] = {"1d20": 20, "d20": 20, "1d100": 100, "d100": 100, "1d6": 6, "d6": 6}
+
+
+@lru_cache(maxsize=256)
+def _compile_dice(expr: str) -> Callable[[], int]:
+    """Specialize a dice expression into a zero-arg roller returning the total.
+
+    Parses once; the roller draws exactly like roll_dice() (same randint calls,
+    same order) but builds no text or breakdown. Used for weapon damage.
+    """
+    terms = _parse_dice(expr.lower().replace(" ", ""))
+    const = sum(sign * n for sign, n, m in terms if m is None)
+    dice = tuple((sign, max(1, n), m) for sign, n, m in terms if m is not None)
+    if not dice:
+        return lambda: const
+    if len(dice) == 1 and dice[0][0] == 1 and dice[0][1] == 1:
+        sides = dice[0][2]
+        return lambda: random.randint(1, sides) + const
+
+    def _roll() -> int:
+        randint = random.randint
+        total = const
+        for sign, n, m in dice:
+            total += sign * sum(randint(1, m) for _ in range(n))
+        return total
+
+    return _roll
+
+
+def roll_dice(expr: str = "1d20", *, include_breakdown: bool = True):
+    """Roll dice expression like '1d20+3', '2d6+1', 'd20'.
+
+    With include_breakdown=False (callers that only need the total) the per-term
+    breakdown strings are skipped: metadata.breakdown is [] and the text shows the total only.
+    The random draws are the same either way.
+    """
+    expr = expr.lower().replace(" ", "")
+    sides = _FAST_DICE.get(expr)
+    if sides is not None:
+        # Single-die fast path: same text/metadata as the general loop below,
+        # including its "{sign:+d}{n}d{m}" term shape (sign +1, n 1)
+        total = random.randint(1, sides)
+        breakdown = [f"{1:+d}1d{sides}({total})"] if include_breakdown else []
+    else:
+        total = 0
+        breakdown = []
+        randint = random.randint
+        for sign, n, m in _parse_dice(expr):
+            if m is not None:
+                rolls = [randint(1, m) for _ in range(max(1, n))]
+                total += sum(rolls) * sign
+                if include_breakdown:
+                    breakdown.append(f"{sign:+d}{n}d{m}({','.join(map(str, rolls))})")
+            else:
+                val = sign * n
+                total += val
+                if include_breakdown:
+                    breakdown.append(f"{val:+d}")
+    text = f"掷骰 {expr} = {total} [{' '.join(breakdown)}]" if include_breakdown else f"掷骰 {expr} = {total}"
     return ToolResponse(
         content=[TextBlock(type="text", text=text)],
         metadata={"expr": expr, "total": total, "breakdown": breakdown},
@@ -3534,24 +3936,39 @@ def skill_check_coc(name: str, skill: str, *, value: Optional[int] = None, diffi
     - difficulty affects only the text/threshold (regular/hard/extreme), we still roll once and report level.
     """
     nm = str(name)
-    st = WORLD.characters.get(nm, {})
     target = int(value) if value is not None else _coc_skill_value(nm, skill)
-    roll = random.randint(1, 100)
+    return _coc_check_result(nm, skill, random.randint(1, 100), target, difficulty)
+
+
+def batch_skill_check_coc(names: List[str], skill: str, *, difficulty: str = "regular") -> List[ToolResponse]:
+    """Roll the same CoC skill check for several actors at once (e.g. a group Spot Hidden).
+
+    Equivalent to calling skill_check_coc(n, skill) for each name in order, including
+    the sequence of random draws; targets are read first, then all d100s are rolled.
+    """
+    nms = [str(n) for n in (names or [])]
+    targets = [_coc_skill_value(nm, skill) for nm in nms]
+    randint = random.randint
+    rolls = [randint(1, 100) for _ in nms]
+    return [_coc_check_result(nm, skill, r, t, difficulty) for nm, r, t in zip(nms, rolls, targets)]
+
+
+# CoC success level by number of thresholds (regular/hard/extreme) the roll meets
+_LEVEL_FROM_IDX: Tuple[Tuple[str, bool], ...] = (
+    ("fail", False),
+    ("regular", True),
+    ("hard", True),
+    ("extreme", True),
+)
+
+
+def _coc_check_result(nm: str, skill: str, roll: int, target: int, difficulty: str) -> ToolResponse:
+    """Classify a d100 roll against `target` and build the skill-check response."""
     t = max(1, int(target))
     hard = max(1, t // 2)
     extreme = max(1, t // 5)
-    if roll <= extreme:
-        level = "extreme"
-        success = True
-    elif roll <= hard:
-        level = "hard"
-        success = True
-    elif roll <= t:
-        level = "regular"
-        success = True
-    else:
-        level = "fail"
-        success = False
+    # extreme <= hard <= t, so the count of thresholds met is the level index
+    level, success = _LEVEL_FROM_IDX[(roll <= t) + (roll <= hard) + (roll <= extreme)]
     txt = f"检定（CoC）：{nm} {skill} d100={roll} / {t} -> {('成功['+level+']') if success else '失败'}"
     return ToolResponse(content=[TextBlock(type="text", text=txt)], metadata={
         "name": nm,
@@ -3576,7 +3993,7 @@ def get_stat_block(name: str) -> ToolResponse:
         coc = dict(st.get("coc") or {})
         chars = {k.upper(): v for k, v in (coc.get("characteristics") or {}).items()}
         der = dict(coc.get("derived") or {})
-        line_chars = ", ".join(f"{k} {int(v)}" for k, v in chars.items() if k in ("STR", "DEX", "CON", "INT", "POW", "APP", "EDU", "SIZ", "LUCK"))
+        line_chars = ", ".join(f"{k} {int(v)}" for k, v in chars.items() if k in _COC_CHAR_KEYS)
         extras = []
         if "san" in der:
             extras.append(f"SAN {int(der['san'])}")
@@ -3630,16 +4047,42 @@ def set_weapon_defs(defs: Dict[str, Dict[str, Any]]):
             for legacy in ("ability", "damage_expr", "proficient_default"):
                 d.pop(legacy, None)
             cleaned[str(k)] = d
+            # Warm the damage roller; malformed expressions still fail at attack time
+            try:
+                _compile_dice(str(d["damage"]).lower())
+            except ValueError:
+                pass
         WORLD.weapon_defs = cleaned
     except Exception:
         WORLD.weapon_defs = {}
         raise
+    finally:
+        _refresh_weapon_summary()
+        WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"武器表载入：{len(WORLD.weapon_defs)} 项")], metadata={"count": len(WORLD.weapon_defs)})
 
 
+def _refresh_weapon_summary() -> None:
+    """Rebuild the HUD/prompt view of weapon_defs (sorted by id)."""
+    WORLD.weapon_summary = {
+        wid: {
+            "label": str((wd or {}).get("label", "")),
+            "desc": str((wd or {}).get("desc") or (wd or {}).get("description", "")),
+            "reach_steps": int((wd or {}).get("reach_steps", DEFAULT_REACH_STEPS)),
+            "skill": str((wd or {}).get("skill", "")),
+            "defense_skill": str((wd or {}).get("defense_skill", "")),
+            "damage": str((wd or {}).get("damage", "")),
+            "damage_type": str((wd or {}).get("damage_type", "physical")),
+        }
+        for wid, wd in sorted((WORLD.weapon_defs or {}).items())
+    }
+
+
 def define_weapon(weapon_id: str, data: Dict[str, Any]):
     wid = str(weapon_id)
     WORLD.weapon_defs[wid] = dict(data or {})
+    _refresh_weapon_summary()
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"武器登记：{wid}")], metadata={"id": wid, **WORLD.weapon_defs[wid]})
 
 
@@ -3651,6 +4094,9 @@ def _attack_resolve_guard_interception(attacker: str, defender: str, reach_steps
     Returns: (final_defender, guard_meta, pre_logs)
     """
     pre_logs: List[TextBlock] = []
+    # No protection links anywhere (the common case): nothing can intercept
+    if not WORLD.guardians:
+        return (defender, None, pre_logs)
     guard_meta: Optional[Dict[str, Any]] = None
     new_defender, meta_guard, pre = _resolve_guard_interception(attacker, defender, reach_steps)
     if pre:
@@ -3694,20 +4140,14 @@ def _attack_run_check_or_contest(
             atk_res = skill_check_coc(attacker, skill_name, value=int(attacker_value))
         else:
             atk_res = skill_check_coc(attacker, skill_name)
-        if atk_res.content:
-            for blk in atk_res.content:
-                if isinstance(blk, dict) and blk.get("type") == "text":
-                    parts.append(blk)
+        _extend_text_blocks(parts, atk_res.content)
         atk_check_meta = dict(atk_res.metadata or {})
         return bool((atk_res.metadata or {}).get("success")), parts, None, atk_check_meta
 
     # No overrides: delegate to generic contest() to keep behaviour identical
     if attacker_value is None and defender_value is None:
         oppose = contest(attacker, skill_name, defender, defense_skill_name)
-        if oppose.content:
-            for blk in oppose.content:
-                if isinstance(blk, dict) and blk.get("type") == "text":
-                    parts.append(blk)
+        _extend_text_blocks(parts, oppose.content)
         oppose_meta = dict(oppose.metadata or {})
         winner = (oppose.metadata or {}).get("winner")
         return (winner == attacker), parts, oppose_meta, None
@@ -3743,6 +4183,13 @@ def _attack_run_check_or_contest(
     return (winner == attacker), parts, oppose_meta, None
 
 
+def _final_damage(total: int, reduction: int) -> int:
+    """Damage left after a flat reduction (armor/barrier); never negative."""
+    r = reduction if reduction > 0 else 0
+    v = total - r
+    return v if v > 0 else 0
+
+
 def _attack_apply_damage(
     defender: str,
     *,
@@ -3755,22 +4202,20 @@ def _attack_apply_damage(
     This step mutates world state (HP) via damage().
     """
     logs: List[TextBlock] = []
-    dmg_res = roll_dice(damage_expr_base)
-    total = int((dmg_res.metadata or {}).get("total", 0))
+    total = _compile_dice(damage_expr_base)()
     # Fixed reduction by armor/barrier depending on damage_type
     reduced = 0
     final = total
     try:
-        coc_d = dict(defender_sheet.get("coc") or {})
-        terra = dict(coc_d.get("terra") or {})
-        prot = dict(terra.get("protection") or {})
+        # Read-only walk down coc.terra.protection; no copies needed
+        prot = ((defender_sheet.get("coc") or {}).get("terra") or {}).get("protection") or {}
         if str(damage_type).lower() == "arts":
             reduced = max(0, int(prot.get("arts_barrier", 0)))
         else:
             reduced = max(0, int(prot.get("physical_armor", 0)))
     except Exception:
         reduced = 0
-    final = max(0, total - int(reduced))
+    final = _final_damage(total, int(reduced))
     dmg_apply = damage(defender, final)
     logs.append(
         TextBlock(
@@ -3778,9 +4223,7 @@ def _attack_apply_damage(
             text=f"伤害：{damage_expr_base} -> {total}{('（减伤 ' + str(reduced) + '）') if reduced else ''}",
         )
     )
-    for blk in (dmg_apply.content or []):
-        if isinstance(blk, dict) and blk.get("type") == "text":
-            logs.append(blk)
+    _extend_text_blocks(logs, dmg_apply.content)
     return logs, int(total), int(reduced), int(final)
 
 
@@ -3796,19 +4239,24 @@ def attack_with_weapon(
     - Uses weapon.skill vs weapon.defense_skill; damage from weapon.damage (NdM[+/-K]).
     - damage_type controls armor/barrier reduction.
     """
+    # Lookup keys; tool callers already pass strings, so avoid re-converting below
+    atk_key = attacker if type(attacker) is str else str(attacker)
+    weapon_key = weapon if type(weapon) is str else str(weapon)
+    # Identity fields shared by every result below; "defender" is updated after guard interception
+    meta_base: Dict[str, Any] = {"attacker": attacker, "defender": defender, "weapon_id": weapon}
     # participants gate: when participants are set, both attacker and defender must be participants
     if WORLD.participants:
-        if str(attacker) not in WORLD.participants or str(defender) not in WORLD.participants:
+        pset = _participant_set()
+        if atk_key not in pset or str(defender) not in pset:
             return ToolResponse(
                 content=[TextBlock(type="text", text=f"参与者限制：仅当前场景参与者可以进行/承受攻击。")],
                 metadata={"ok": False, "error_type": "not_participant", "attacker": attacker, "defender": defender},
             )
     # Gate by system/control statuses
-    blocked, msg = _blocked_action(str(attacker), "attack")
+    blocked, msg = _blocked_action(atk_key, "attack")
     if blocked:
-        return ToolResponse(content=[TextBlock(type="text", text=msg)], metadata={"attacker": attacker, "defender": defender, "weapon_id": weapon, "ok": False, "error_type": "attacker_unable"})
-    atk = WORLD.characters.get(attacker, {})
-    w = WORLD.weapon_defs.get(str(weapon), {})
+        return ToolResponse(content=[TextBlock(type="text", text=msg)], metadata={**meta_base, "ok": False, "error_type": "attacker_unable"})
+    w = WORLD.weapon_defs.get(weapon_key, {})
     try:
         reach_steps = max(1, int(w.get("reach_steps", DEFAULT_REACH_STEPS)))
     except Exception:
@@ -3827,33 +4275,22 @@ def attack_with_weapon(
             metadata={"ok": False, "error_type": "weapon_def_invalid", "weapon_id": weapon},
         )
 
-    # Distance string helper
-    def _fmt_distance(steps: Optional[int]) -> str:
-        if steps is None:
-            return "未知"
-        return format_distance_steps(int(steps))
-
     # Ownership gate: attacker must possess the weapon (count > 0)
-    bag = WORLD.inventory.get(str(attacker), {}) or {}
-    if int(bag.get(str(weapon), 0)) <= 0:
+    bag = WORLD.inventory.get(atk_key) or _EMPTY_DICT
+    if int(bag.get(weapon_key, 0)) <= 0:
         msg = TextBlock(type="text", text=f"{attacker} 未持有武器 {weapon}，攻击取消。")
         return ToolResponse(
             content=[msg],
-            metadata={
-                "ok": False,
-                "attacker": attacker,
-                "defender": defender,
-                "weapon_id": weapon,
-                "error_type": "weapon_not_owned",
-            },
+            metadata={"ok": False, **meta_base, "error_type": "weapon_not_owned"},
         )
 
     # Protection interception (may change defender)
     defender2, guard_meta, pre_logs = _attack_resolve_guard_interception(attacker, defender, reach_steps)
-    defender = defender2
+    defender = meta_base["defender"] = defender2
 
     # Post-interception snapshot for defender stat and distance gate
-    dfd = WORLD.characters.get(defender, {})
+    chars = WORLD.characters
+    dfd = chars.get(defender, _EMPTY_DICT)
     distance_before = _attack_compute_distance(attacker, defender)
     # Cross-scene or unknown distance -> treat as unreachable in this minimal scheme
     if distance_before is None:
@@ -3863,9 +4300,7 @@ def attack_with_weapon(
             metadata={
                 "ok": False,
                 "error_type": "out_of_reach",
-                "attacker": attacker,
-                "defender": defender,
-                "weapon_id": weapon,
+                **meta_base,
                 "hit": False,
                 "reach_ok": False,
                 "distance_before": None,
@@ -3880,9 +4315,7 @@ def attack_with_weapon(
             metadata={
                 "ok": False,
                 "error_type": "out_of_reach",
-                "attacker": attacker,
-                "defender": defender,
-                "weapon_id": weapon,
+                **meta_base,
                 "hit": False,
                 "reach_ok": False,
                 "distance_before": distance_before,
@@ -3909,7 +4342,7 @@ def attack_with_weapon(
     )
     if logs_check:
         parts.extend(logs_check)
-    hp_before = int(WORLD.characters.get(defender, {}).get("hp", dfd.get("hp", 0)))
+    hp_before = int(dfd.get("hp", 0))
     dmg_total = 0
     if success:
         dmg_logs, total, reduced, final = _attack_apply_damage(
@@ -3920,15 +4353,20 @@ def attack_with_weapon(
         )
         parts.extend(dmg_logs)
         dmg_total = final
-    hp_after = int(WORLD.characters.get(defender, {}).get("hp", dfd.get("hp", 0)))
+    # damage() mutates the sheet in place, so dfd is current; re-look up only if it had to create one
+    hp_after = int((chars.get(defender, dfd) if dfd is _EMPTY_DICT else dfd).get("hp", 0))
     distance_after = distance_before
     # Any hit/miss still mutates state through damage(); touch once per attack
     WORLD._touch()
+    # Contest/check metadata to align with previous behavior
+    if _is_dying(defender):
+        check_meta: Dict[str, Any] = {"opposed": False, "defender_dying": True, "attack_check": atk_check_meta}
+    else:
+        check_meta = {"opposed": True, "opposed_meta": oppose_meta}
+    # Built in one literal, always in this key order: identity, outcome, reach, [guard], check
     meta: Dict[str, Any] = {
         "ok": True,
-        "attacker": attacker,
-        "defender": defender,
-        "weapon_id": weapon,
+        **meta_base,
         "hit": success,
         "base_mod": 0,
         "damage_total": int(dmg_total),
@@ -3939,12 +4377,8 @@ def attack_with_weapon(
         "distance_after": distance_after,
         "reach_steps": reach_steps,
         **({"guard": guard_meta} if guard_meta else {}),
+        **check_meta,
     }
-    # Attach contest/check metadata to align with previous behavior
-    if _is_dying(defender):
-        meta.update({"opposed": False, "defender_dying": True, "attack_check": atk_check_meta})
-    else:
-        meta.update({"opposed": True, "opposed_meta": oppose_meta})
     return ToolResponse(content=parts, metadata=meta)
 
 
@@ -3958,6 +4392,10 @@ def _replace_ability_tokens(expr: str, ability_mod: int) -> str:
     before calling the dice roller.
     """
     s = expr
+    # Every token starts with one of these capitals; plain dice such as "1d6+1"
+    # contain none, so skip the per-token scans.
+    if not any(c in s for c in "SDCIAE"):
+        return s
     # Intentionally exclude POW from the replacement list to deprecate
     # "+POW" usage in weapon damage expressions.
     for token in ("STR", "DEX", "CON", "INT", "SIZ", "APP", "EDU"):
@@ -3967,15 +4405,15 @@ def _replace_ability_tokens(expr: str, ability_mod: int) -> str:
 
 def _coc_to_dnd_score(x: int) -> int:
     try:
-        return max(1, int(round(int(x) / 5.0)))
+        v = int(x)
     except Exception:
         return 10
+    # round(v / 5) without floats: v / 5 never lands on .5 for integers
+    return max(1, (v + 2) // 5)
 
 def _coc_ability_mod_for(name: str, ab_name: str) -> int:
-    st = WORLD.characters.get(str(name), {})
-    coc = dict(st.get("coc") or {})
-    ch = {k.upper(): int(v) for k, v in (coc.get("characteristics") or {}).items()}
-    val = int(ch.get(str(ab_name).upper(), 50))
+    raw = _coc_block(str(name)).get("characteristics") or {}
+    val = _char_stat(raw, str(ab_name).upper())
     score = _coc_to_dnd_score(val)
     return (score - 10) // 2
 
@@ -3985,6 +4423,35 @@ def _weapon_skill_for(weapon_id: str, reach_steps: int, ability: str) -> str:
         return "MeleeWeapons"
     return "RangedWeapons"
 
+# Default percentiles for skills missing from a sheet (Dodge is derived from DEX)
+_COC_DEFAULTS_BASE: Mapping[str, int] = MappingProxyType({
+    # Core skills
+    "Stealth": 20,
+    "Perception": 25,  # Spot Hidden analogue
+    "Arts_Resist": 40,
+    "FirstAid": 30,
+    "Medicine": 5,
+    # Coarse combat fallbacks
+    "MeleeWeapons": 25,
+    "RangedWeapons": 25,
+    # Standard set (Terra-flavored)
+    "Fighting_Brawl": 25,
+    "Fighting_Blade": 30,
+    "Fighting_DualBlade": 25,
+    "Fighting_Polearm": 30,
+    "Fighting_Blunt": 25,
+    "Fighting_Shield": 20,
+    "Firearms_Handgun": 25,
+    "Firearms_Rifle_Crossbow": 30,
+    "Firearms_Shotgun": 25,
+    "Heavy_Weapons": 20,
+    "Throwables_Explosives": 30,
+    # Arts (mutable, choose table-rules as needed)
+    "Arts_Offense": 40,
+    "Arts_Control": 40,
+})
+
+
 def _coc_skill_value(name: str, skill: str) -> int:
     """Return a CoC percentile value for a skill or characteristic.
 
@@ -3993,54 +4460,81 @@ def _coc_skill_value(name: str, skill: str) -> int:
     - Else, look up in coc.skills; fall back to sensible defaults.
     """
     nm = str(name)
-    st = WORLD.characters.get(nm, {})
-    coc = dict(st.get("coc") or {})
+    coc = _coc_block(nm)
     # Characteristic passthrough
-    if str(skill).upper() in {"STR", "DEX", "CON", "INT", "POW", "APP", "EDU", "SIZ", "LUCK"}:
+    if str(skill).upper() in _COC_CHAR_KEYS:
         try:
-            ch = {k.upper(): int(v) for k, v in (coc.get("characteristics") or {}).items()}
+            return _char_stat(coc.get("characteristics") or {}, str(skill).upper())
         except Exception:
-            ch = {}
-        return int(ch.get(str(skill).upper(), 50))
+            return 50
     # Skills (explicit)
     skills = coc.get("skills") or {}
     if isinstance(skills, dict):
         v = skills.get(skill) or skills.get(str(skill).title()) or skills.get(str(skill).lower())
         if isinstance(v, (int, float)):
             return max(0, int(v))
-    # Defaults
-    ch = {k.upper(): int(v) for k, v in (coc.get("characteristics") or {}).items()}
-    defaults = {
-        # Core skills
-        "Stealth": 20,
-        "Perception": 25,  # Spot Hidden analogue
-        "Dodge": max(1, int(ch.get("DEX", 50) // 2)),
-        "Arts_Resist": 40,
-        "FirstAid": 30,
-        "Medicine": 5,
-        # Coarse combat fallbacks
-        "MeleeWeapons": 25,
-        "RangedWeapons": 25,
-        # Standard set (Terra-flavored)
-        "Fighting_Brawl": 25,
-        "Fighting_Blade": 30,
-        "Fighting_DualBlade": 25,
-        "Fighting_Polearm": 30,
-        "Fighting_Blunt": 25,
-        "Fighting_Shield": 20,
-        "Firearms_Handgun": 25,
-        "Firearms_Rifle_Crossbow": 30,
-        "Firearms_Shotgun": 25,
-        "Heavy_Weapons": 20,
-        "Throwables_Explosives": 30,
-        # Arts (mutable, choose table-rules as needed)
-        "Arts_Offense": 40,
-        "Arts_Control": 40,
-    }
-    return int(defaults.get(skill, 25))
+    # Defaults (Dodge is the only DEX-dependent entry)
+    if skill == "Dodge":
+        return max(1, _char_stat(coc.get("characteristics") or {}, "DEX") // 2)
+    return int(_COC_DEFAULTS_BASE.get(skill, 25))
 
 
 # ---- Arts helpers ----
+# Arts expressions are validated on every cast; build the lookup tables and patterns once.
+_ALLOWED_DICE_CHARS = frozenset("0123456789d+-")
+# ASCII lower-casing plus space removal in one str.translate pass
+_CASE_AND_SPACE = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz", " ")
+# Characters a control duration may contain after token replacement (see _eval_int_expr)
+_DURATION_CHARS = frozenset("0123456789+- \t")
+# (token, TOKEN_RAW, TOKEN_10, TOKEN_5, TOKEN) patterns for _replace_art_tokens (no POW).
+_ART_TOKEN_PATTERNS = tuple(
+    (tok, re.compile(rf"\b{tok}_RAW\b"), re.compile(rf"\b{tok}_10\b"), re.compile(rf"\b{tok}_5\b"), re.compile(rf"\b{tok}\b"))
+    for tok in ("STR", "DEX", "CON", "INT", "SIZ", "APP", "EDU")
+)
+
+
+# Allow optional one-line description; canonical key is 'desc'.
+_ART_ALLOWED_KEYS = frozenset({"label", "cast_skill", "resist", "range_steps", "damage_type", "mp", "damage", "heal", "control", "tags", "desc", "description"})
+
+
+def _validate_art(k: Any, v: Any) -> Dict[str, Any]:
+    """Validate and normalize one art definition (see set_arts_defs); raises on invalid input."""
+    if not isinstance(v, dict):
+        raise ValueError(f"art {k} must be an object")
+    d = {str(kk): vv for kk, vv in v.items()}
+    extra = set(d.keys()) - _ART_ALLOWED_KEYS
+    if extra:
+        raise ValueError(f"art {k} has unknown keys: {sorted(extra)}")
+    for req in ("label","cast_skill","resist","range_steps","damage_type"):
+        if req not in d:
+            raise ValueError(f"art {k} missing required field '{req}'")
+    d["label"] = str(d.get("label") or "")
+    # normalize description aliases to 'desc'
+    if "desc" in d:
+        d["desc"] = str(d.get("desc") or "")
+    elif "description" in d:
+        d["desc"] = str(d.get("description") or "")
+        d.pop("description", None)
+    d["cast_skill"] = str(d.get("cast_skill") or "")
+    d["resist"] = str(d.get("resist") or "")
+    if d["resist"].upper() == "POW":
+        raise ValueError(f"art {k}.resist cannot be 'POW' (removed); use a skill like 'Arts_Resist'")
+    d["range_steps"] = int(d.get("range_steps") or 0)
+    d["damage_type"] = str(d.get("damage_type") or "arts").lower()
+    if d["range_steps"] <= 0:
+        raise ValueError(f"art {k}.range_steps must be > 0")
+    # Normalize optional shapes
+    if "mp" in d and isinstance(d["mp"], dict):
+        mp = d["mp"]
+        d["mp"] = {"cost": int(mp.get("cost", 0) or 0), "variable": bool(mp.get("variable", False)), "max": int(mp.get("max", 0) or 0)}
+    if "control" in d and isinstance(d["control"], dict):
+        c = d["control"]
+        d["control"] = {"effect": str(c.get("effect", "")), "duration": str(c.get("duration", ""))}
+    if "tags" in d and isinstance(d["tags"], list):
+        d["tags"] = [str(x) for x in d["tags"]]
+    return d
+
+
 def set_arts_defs(defs: Dict[str, Dict[str, Any]]):
     """Strictly set arts definitions (CoC-flavored), with POW removed from usage.
 
@@ -4058,55 +4552,28 @@ def set_arts_defs(defs: Dict[str, Dict[str, Any]]):
       - tags: list[str]
     Note: +POW/POWER 相关写法已移除，不允许在术式中使用 POW/POWER 占位符。
     """
-    # Allow optional one-line description; canonical key is 'desc'.
-    allowed = {"label","cast_skill","resist","range_steps","damage_type","mp","damage","heal","control","tags","desc","description"}
     try:
         cleaned: Dict[str, Dict[str, Any]] = {}
         for k, v in (defs or {}).items():
-            if not isinstance(v, dict):
-                raise ValueError(f"art {k} must be an object")
-            d = {str(kk): vv for kk, vv in v.items()}
-            extra = set(d.keys()) - allowed
-            if extra:
-                raise ValueError(f"art {k} has unknown keys: {sorted(extra)}")
-            for req in ("label","cast_skill","resist","range_steps","damage_type"):
-                if req not in d:
-                    raise ValueError(f"art {k} missing required field '{req}'")
-            d["label"] = str(d.get("label") or "")
-            # normalize description aliases to 'desc'
-            if "desc" in d:
-                d["desc"] = str(d.get("desc") or "")
-            elif "description" in d:
-                d["desc"] = str(d.get("description") or "")
-                d.pop("description", None)
-            d["cast_skill"] = str(d.get("cast_skill") or "")
-            d["resist"] = str(d.get("resist") or "")
-            if d["resist"].upper() == "POW":
-                raise ValueError(f"art {k}.resist cannot be 'POW' (removed); use a skill like 'Arts_Resist'")
-            d["range_steps"] = int(d.get("range_steps") or 0)
-            d["damage_type"] = str(d.get("damage_type") or "arts").lower()
-            if d["range_steps"] <= 0:
-                raise ValueError(f"art {k}.range_steps must be > 0")
-            # Normalize optional shapes
-            if "mp" in d and isinstance(d["mp"], dict):
-                mp = d["mp"]
-                d["mp"] = {"cost": int(mp.get("cost", 0) or 0), "variable": bool(mp.get("variable", False)), "max": int(mp.get("max", 0) or 0)}
-            if "control" in d and isinstance(d["control"], dict):
-                c = d["control"]
-                d["control"] = {"effect": str(c.get("effect", "")), "duration": str(c.get("duration", ""))}
-            if "tags" in d and isinstance(d["tags"], list):
-                d["tags"] = [str(x) for x in d["tags"]]
-            cleaned[str(k)] = d
+            cleaned[str(k)] = _validate_art(k, v)
         WORLD.arts_defs = cleaned
     except Exception:
         WORLD.arts_defs = {}
         raise
+    finally:
+        WORLD.arts_defs_version += 1
+        _refresh_arts_summary()
+        WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"术式表载入：{len(WORLD.arts_defs)} 项")], metadata={"count": len(WORLD.arts_defs)})
 
 
 def define_art(art_id: str, data: Dict[str, Any]):
+    """Add or replace a single art, validating only that entry (other arts are kept)."""
     aid = str(art_id)
-    res = set_arts_defs({aid: dict(data or {})})
+    WORLD.arts_defs[aid] = _validate_art(aid, dict(data or {}))
+    WORLD.arts_defs_version += 1
+    _refresh_arts_summary()
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"术式登记：{aid}")], metadata={"id": aid, **WORLD.arts_defs[aid]})
 
 
@@ -4114,15 +4581,20 @@ def get_arts_defs() -> Dict[str, Dict[str, Any]]:
     """Return a sanitized copy of arts definitions (strict CoC schema).
 
     Exposed fields (for prompts/front-end): label, cast_skill, resist, range_steps,
-    damage_type, mp, damage, heal, control
+    damage_type, mp, damage, heal, control. Entries are shared with the cached
+    summary; treat them as read-only.
     """
+    return dict(WORLD.arts_summary)
+
+
+def _refresh_arts_summary() -> None:
+    """Rebuild the sanitized, id-sorted view returned by get_arts_defs()."""
     out: Dict[str, Dict[str, Any]] = {}
-    for aid, data in (WORLD.arts_defs or {}).items():
-        try:
-            d = dict(data or {})
-        except Exception:
-            d = {}
-        mp_cfg = dict(d.get("mp") or {}) if isinstance(d.get("mp"), dict) else {}
+    for aid, data in sorted((WORLD.arts_defs or {}).items()):
+        d = data if isinstance(data, dict) else {}
+        mp_cfg = d.get("mp")
+        if not isinstance(mp_cfg, dict):
+            mp_cfg = {}
         out[str(aid)] = {
             "label": str(d.get("label", "")),
             **({"desc": str(d.get("desc", ""))} if d.get("desc") else {}),
@@ -4139,7 +4611,81 @@ def get_arts_defs() -> Dict[str, Dict[str, Any]]:
             **({"heal": str(d.get("heal"))} if d.get("heal") else {}),
             **({"control": {"effect": str((d.get("control") or {}).get("effect", "")), "duration": str((d.get("control") or {}).get("duration", ""))}} if isinstance(d.get("control"), dict) else {}),
         }
-    return out
+    WORLD.arts_summary = out
+
+
+def _eval_int_expr(expr: str) -> int:
+    """Evaluate a sum of signed integers such as "2", "1+1" or "3 - 1" (no eval).
+
+    Raises ValueError for anything else (operators other than +/-, dangling signs, empty input).
+    """
+    total = 0
+    sign = 1
+    num: Optional[int] = None
+    closed = False  # a number was followed by whitespace; only an operator may come next
+    for c in str(expr):
+        if "0" <= c <= "9":
+            if closed:
+                raise ValueError(f"missing operator in integer expression: {expr!r}")
+            num = (num or 0) * 10 + (ord(c) - 48)
+        elif c == "+" or c == "-":
+            if num is not None:
+                total += sign * num
+                num = None
+                sign = 1
+                closed = False
+            if c == "-":
+                sign = -sign
+        elif c == " " or c == "\t":
+            closed = num is not None
+        else:
+            raise ValueError(f"unsupported character in integer expression: {c!r}")
+    if num is None:
+        raise ValueError(f"incomplete integer expression: {expr!r}")
+    return total + sign * num
+
+
+# art id -> (world, arts_defs_version, compiled fields); see _compiled_art
+_ARTS_COMPILED_CACHE: Dict[str, Tuple[World, int, Tuple[Any, ...]]] = {}
+# Shared tag set for the (common) untagged art
+_NO_TAGS: frozenset = frozenset()
+
+
+def _compiled_art(art_id: str) -> Optional[Tuple[Any, ...]]:
+    """Return the fields cast_arts needs for `art_id`, or None if it is not defined.
+
+    (cast_skill, resist, range_steps, damage_type, damage, heal, control, tags, mp_cost, mp_mode, mp_max)
+    Memoized per WORLD.arts_defs_version, so set_arts_defs invalidates every entry.
+    """
+    ver = WORLD.arts_defs_version
+    cached = _ARTS_COMPILED_CACHE.get(art_id)
+    if cached is not None and cached[0] is WORLD and cached[1] == ver:
+        return cached[2]
+    ad = (WORLD.arts_defs or {}).get(art_id)
+    if not ad or not isinstance(ad, dict):
+        return None
+    ctrl = ad.get("control")
+    if not isinstance(ctrl, dict):
+        ctrl = {}
+    mp_cfg = ad.get("mp")
+    if not isinstance(mp_cfg, dict):
+        mp_cfg = {}
+    tags = ad.get("tags")
+    compiled = (
+        str(ad.get("cast_skill") or ""),
+        str(ad.get("resist") or ""),
+        int(ad.get("range_steps", 6)),
+        str(ad.get("damage_type", "arts")).lower(),
+        str(ad.get("damage") or ""),
+        str(ad.get("heal") or ""),
+        ctrl,
+        frozenset(tags) if tags else _NO_TAGS,
+        int(mp_cfg.get("cost", 0)),
+        "variable" if bool(mp_cfg.get("variable", False)) else "fixed",
+        int(mp_cfg.get("max", 0) or 0),
+    )
+    _ARTS_COMPILED_CACHE[art_id] = (WORLD, ver, compiled)
+    return compiled
 
 
 def _replace_art_tokens(attacker: str, expr: str, *, mp_spent: int = 0, base_cost: int = 0) -> str:
@@ -4151,8 +4697,6 @@ def _replace_art_tokens(attacker: str, expr: str, *, mp_spent: int = 0, base_cos
 
     说明：不再支持 POWER/POW/MP 类占位符。若表达式仍包含这些标记，将在调用处被判定为无效表达式。
     """
-    import re  # local import to avoid changing module top
-
     def _coc_raw_for(name: str, ab_name: str) -> int:
         st = WORLD.characters.get(str(name), {})
         coc = dict(st.get("coc") or {})
@@ -4175,17 +4719,22 @@ def _replace_art_tokens(attacker: str, expr: str, *, mp_spent: int = 0, base_cos
 
     # MP 不再被替换；在调用处统一做表达式有效性检查
 
+    # Most formulas are plain dice (e.g. 2d6+1): skip the regex passes entirely
+    present = [row for row in _ART_TOKEN_PATTERNS if row[0] in s]
+    if not present:
+        return s
+    raws = {tok: _coc_raw_for(attacker, tok) for tok, *_ in present}
+
     # Extended CoC ability forms: *_RAW, *_10, *_5 (exclude POW)
-    for token in ("STR", "DEX", "CON", "INT", "SIZ", "APP", "EDU"):
-        raw = _coc_raw_for(attacker, token)
-        s = re.sub(rf"\b{token}_RAW\b", str(raw), s)
-        s = re.sub(rf"\b{token}_10\b", str(_tens(raw)), s)
-        s = re.sub(rf"\b{token}_5\b", str(_div5(raw)), s)
+    for token, pat_raw, pat_10, pat_5, _pat in present:
+        raw = raws[token]
+        s = pat_raw.sub(str(raw), s)
+        s = pat_10.sub(str(_tens(raw)), s)
+        s = pat_5.sub(str(_div5(raw)), s)
 
     # Base ability tokens -> tens by default (exclude POW)
-    for token in ("STR", "DEX", "CON", "INT", "SIZ", "APP", "EDU"):
-        raw = _coc_raw_for(attacker, token)
-        s = re.sub(rf"\b{token}\b", str(_tens(raw)), s)
+    for token, _raw, _10, _5, pat in present:
+        s = pat.sub(str(_tens(raws[token])), s)
 
     return s
 
@@ -4203,31 +4752,20 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
     blocked, msg = _blocked_action(str(attacker), "cast")
     if blocked:
         return ToolResponse(content=[TextBlock(type="text", text=msg)], metadata={"ok": False, "attacker": attacker, "art_id": str(art), "error_type": "attacker_unable"})
-    # participants gate
-    if WORLD.participants:
-        if str(attacker) not in WORLD.participants:
+    # participants gate: one combined membership test; work out which side failed only when it does
+    pset = _participant_set() if WORLD.participants else None
+    if pset and (str(attacker) not in pset or (target and str(target) not in pset)):
+        if str(attacker) not in pset:
             return ToolResponse(content=[TextBlock(type="text", text=f"参与者限制：{attacker} 非参与者")], metadata={"ok": False, "error_type": "not_participant", "attacker": attacker})
-        if target and str(target) not in WORLD.participants:
-            return ToolResponse(content=[TextBlock(type="text", text=f"参与者限制：{target} 非参与者")], metadata={"ok": False, "error_type": "not_participant", "target": target})
+        return ToolResponse(content=[TextBlock(type="text", text=f"参与者限制：{target} 非参与者")], metadata={"ok": False, "error_type": "not_participant", "target": target})
 
-    ad = dict((WORLD.arts_defs or {}).get(str(art), {}) or {})
-    if not ad:
+    compiled = _compiled_art(str(art))
+    if compiled is None:
         return ToolResponse(content=[TextBlock(type="text", text=f"未知术式 {art}")], metadata={"ok": False, "error_type": "unknown_art"})
 
-    cast_skill = str(ad.get("cast_skill") or "")
-    resist = str(ad.get("resist") or "")
+    cast_skill, resist, rng, dtype, dmg_expr, heal_expr, ctrl, tags, mp_cost, mp_mode, mp_max = compiled
     if not cast_skill or not resist:
         return ToolResponse(content=[TextBlock(type="text", text=f"术式定义不完整（缺少 cast_skill 或 resist）：{art}")], metadata={"ok": False, "error_type": "art_def_invalid", "art": art})
-    rng = int(ad.get("range_steps", 6))
-    dtype = str(ad.get("damage_type", "arts")).lower()
-    dmg_expr = str(ad.get("damage") or "")
-    heal_expr = str(ad.get("heal") or "")
-    ctrl = dict(ad.get("control") or {}) if isinstance(ad.get("control"), dict) else {}
-    tags = set(ad.get("tags") or [])
-    mp_cfg = dict(ad.get("mp") or {}) if isinstance(ad.get("mp"), dict) else {}
-    mp_cost = int(mp_cfg.get("cost", 0))
-    mp_mode = "variable" if bool(mp_cfg.get("variable", False)) else "fixed"
-    mp_max = int(mp_cfg.get("max", 0) or 0)
 
     # Target resolution (single target minimal)
     tgt = str(target) if target else None
@@ -4348,9 +4886,7 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
                     dice_expr=over_expr,
                     bonus=0,
                 )
-                for blk in (exp_res.content or []):
-                    if isinstance(blk, dict) and blk.get("type") == "text":
-                        mp_logs.append(blk)
+                _extend_text_blocks(mp_logs, exp_res.content)
             except Exception:
                 # 过载应激失败不阻断施术本体，仅不追加说明
                 pass
@@ -4379,24 +4915,24 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
     mult = 1.0
 
     effects: List[Dict[str, Any]] = []
-    hp_before = int(WORLD.characters.get(tgt, {}).get("hp", 0))
+    chars = WORLD.characters
+    dfd = chars.get(tgt, _EMPTY_DICT)
+    hp_before = int(dfd.get("hp", 0))
     dmg_total = 0
     healed = 0
     if success and dmg_expr:
         expr = _replace_art_tokens(attacker, dmg_expr, mp_spent=eff_spent, base_cost=mp_cost)
         # 表达式中不允许出现字母（仅允许 NdM 与 +/- 常数）；若含未替换标记（如 MP/POW），直接报错
-        import re as _re
         # Allow classic dice notation NdM with optional +/- constants. We forbid any
         # letters other than 'd' (case-insensitive) to prevent leaking tokens like
         # POW/MP/skill names into the arithmetic expression.
-        expr_norm = str(expr or "").lower().replace(" ", "")
-        if _re.search(r"[^0-9d+\-]", expr_norm):
+        expr_norm = str(expr or "").translate(_CASE_AND_SPACE)
+        if not _ALLOWED_DICE_CHARS.issuperset(expr_norm):
             return ToolResponse(
                 content=parts + [TextBlock(type="text", text=f"术式伤害表达式不被支持：{dmg_expr}")],
                 metadata={"ok": False, "error_type": "art_damage_expr_invalid", "expr": dmg_expr},
             )
         # Apply using unified damage step
-        dfd = WORLD.characters.get(tgt, {})
         dmg_logs, total, reduced, final = _attack_apply_damage(
             tgt,
             damage_expr_base=expr,
@@ -4410,21 +4946,18 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
 
     if success and heal_expr:
         expr = _replace_art_tokens(attacker, heal_expr, mp_spent=eff_spent, base_cost=mp_cost)
-        import re as _re
-        expr_norm = str(expr or "").lower().replace(" ", "")
-        if _re.search(r"[^0-9d+\-]", expr_norm):
+        expr_norm = str(expr or "").translate(_CASE_AND_SPACE)
+        if not _ALLOWED_DICE_CHARS.issuperset(expr_norm):
             return ToolResponse(
                 content=parts + [TextBlock(type="text", text=f"术式治疗表达式不被支持：{heal_expr}")],
                 metadata={"ok": False, "error_type": "art_heal_expr_invalid", "expr": heal_expr},
             )
-        roll = roll_dice(expr)
+        roll = roll_dice(expr, include_breakdown=False)
         val = int((roll.metadata or {}).get("total", 0))
         healed = max(0, val)
         parts.append(TextBlock(type="text", text=f"术式治疗：{expr} -> {healed}"))
         heal_res = heal(tgt, healed)
-        for blk in (heal_res.content or []):
-            if isinstance(blk, dict) and blk.get("type") == "text":
-                parts.append(blk)
+        _extend_text_blocks(parts, heal_res.content)
         effects.append({"who": tgt, "heal": healed})
 
     # Control effect (unified status management)
@@ -4432,24 +4965,23 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
         eff = str(ctrl.get("effect"))
         dur_expr = str(ctrl.get("duration") or "1")
         dur_str = _replace_art_tokens(attacker, dur_expr, mp_spent=eff_spent, base_cost=mp_cost)
-        import re as _re
-        if _re.search(r"[A-Za-z]", dur_str):
+        # Anything beyond signed integer sums (letters, *, parentheses, ...) is reported, not guessed
+        if not _DURATION_CHARS.issuperset(dur_str):
             return ToolResponse(content=parts + [TextBlock(type="text", text=f"术式持续时间表达式不被支持：{dur_expr}")], metadata={"ok": False, "error_type": "art_duration_expr_invalid", "expr": dur_expr})
         try:
-            dur_val = int(eval(dur_str, {"__builtins__": {}}, {}))  # simple integer expression
+            dur_val = _eval_int_expr(dur_str)  # simple +/- integer expression
         except Exception:
             dur_val = 1
         parts.append(TextBlock(type="text", text=f"控制：{eff}（持续 {dur_val} 轮）"))
         try:
             sr = add_status(tgt, eff, duration_rounds=dur_val, kind="control", source=attacker)
-            for blk in (sr.content or []):
-                if isinstance(blk, dict) and blk.get("type") == "text":
-                    parts.append(blk)
+            _extend_text_blocks(parts, sr.content)
         except Exception:
             pass
         effects.append({"who": tgt, "state": eff, "duration_rounds": int(dur_val)})
 
-    hp_after = int(WORLD.characters.get(tgt, {}).get("hp", 0))
+    # damage()/heal() update the sheet in place; re-look up only if it was missing at cast time
+    hp_after = int((chars.get(tgt, dfd) if dfd is _EMPTY_DICT else dfd).get("hp", 0))
     WORLD._touch()
     meta = {
         "ok": True,
@@ -4462,101 +4994,175 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
         "hp_before": hp_before,
         "hp_after": hp_after,
         "effects": effects,
+        **({"guard": guard_meta} if guard_meta else {}),
     }
-    if guard_meta:
-        meta["guard"] = guard_meta
     return ToolResponse(content=parts, metadata=meta)
 
 
 def _signed(x: int) -> str:
-    return f"+{x}" if x >= 0 else str(x)
+    return format(x, "+d")
 
 
 # ---- Objective status helpers ----
-def complete_objective(name: str, note: str = ""):
+def _ensure_objective(name: Any) -> str:
+    """Return the objective name, appending it to WORLD.objectives if it is not listed yet."""
     nm = str(name)
-    if nm not in WORLD.objectives:
-        WORLD.objectives.append(nm)
+    objs = WORLD.objectives
+    if nm not in objs:
+        objs.append(nm)
+    return nm
+
+
+def complete_objective(name: str, note: str = ""):
+    nm = _ensure_objective(name)
     WORLD.objective_status[nm] = "done"
     if note:
         WORLD.objective_notes[nm] = note
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"目标完成：{nm}")], metadata={"objectives": list(WORLD.objectives), "status": dict(WORLD.objective_status)})
 
 def block_objective(name: str, reason: str = ""):
-    nm = str(name)
-    if nm not in WORLD.objectives:
-        WORLD.objectives.append(nm)
+    nm = _ensure_objective(name)
     WORLD.objective_status[nm] = "blocked"
     if reason:
         WORLD.objective_notes[nm] = reason
+    WORLD._touch()
     suffix = f"，理由：{reason}" if reason else ""
     return ToolResponse(content=[TextBlock(type="text", text=f"目标受阻：{nm}{suffix}")], metadata={"objectives": list(WORLD.objectives), "status": dict(WORLD.objective_status)})
 
 # ---- Event clock ----
 def schedule_event(name: str, at_min: int, note: str = "", effects: Optional[List[Dict[str, Any]]] = None):
-    WORLD.events.append({"name": str(name), "at": int(at_min), "note": str(note), "effects": list(effects or [])})
-    WORLD.events.sort(key=lambda x: x.get("at", 0))
-    return ToolResponse(content=[TextBlock(type="text", text=f"计划事件：{name}@{int(at_min)}分钟")], metadata={"queued": len(WORLD.events)})
+    at = int(at_min)
+    seq = WORLD.event_seq
+    WORLD.event_seq = seq + 1
+    WORLD.event_pending.add(seq)
+    heapq.heappush(WORLD.events, (at, seq, {"name": str(name), "at": at, "note": str(note), "effects": list(effects or [])}))
+    return ToolResponse(content=[TextBlock(type="text", text=f"计划事件：{name}@{at}分钟")], metadata={"queued": len(WORLD.events), "id": seq})
+
+def cancel_event(event_id: int):
+    """Cancel a scheduled event by the id returned from schedule_event (O(1), lazy).
+
+    The entry stays in the heap until it surfaces in process_events; the heap is
+    compacted once cancelled ids outnumber half of the queued entries.
+    """
+    eid = _safe_int(event_id)
+    # Fired, already-cancelled and never-scheduled ids are all rejected
+    if eid is None or eid not in WORLD.event_pending:
+        return ToolResponse(content=[TextBlock(type="text", text=f"未找到可取消的事件：{event_id}")], metadata={"ok": False, "error_type": "unknown_event", "id": event_id})
+    WORLD.event_pending.discard(eid)
+    cancelled = WORLD.event_cancelled
+    cancelled.add(eid)
+    if len(cancelled) > len(WORLD.events) // 2:
+        live = [e for e in WORLD.events if e[1] not in cancelled]
+        heapq.heapify(live)
+        WORLD.events = live
+        # Every cancelled id is now purged from the heap
+        cancelled.clear()
+    return ToolResponse(content=[TextBlock(type="text", text=f"取消事件：#{eid}")], metadata={"ok": True, "id": eid, "queued": len(WORLD.events)})
+
+# ---- Event effects (one handler per effect kind; unknown kinds are ignored) ----
+def _eff_add_objective(eff: Dict[str, Any]) -> None:
+    add_objective(str(eff.get("name")))
+
+
+def _eff_complete_objective(eff: Dict[str, Any]) -> None:
+    complete_objective(str(eff.get("name")))
+
+
+def _eff_block_objective(eff: Dict[str, Any]) -> None:
+    block_objective(str(eff.get("name")), str(eff.get("reason", "")))
+
+
+def _eff_relation(eff: Dict[str, Any]) -> None:
+    # require absolute target (value or target); delta fallback removed
+    a, b = eff.get("a"), eff.get("b")
+    if a and b:
+        if "value" in eff:
+            v = eff.get("value")
+        elif "target" in eff:
+            v = eff.get("target")
+        else:
+            raise ValueError("relation effect requires 'value' or 'target'")
+        set_relation(str(a), str(b), int(v), reason=str(eff.get("reason", "")))
+
+
+def _eff_grant(eff: Dict[str, Any]) -> None:
+    grant_item(str(eff.get("target")), str(eff.get("item")), int(eff.get("n", 1)))
+
+
+def _eff_damage(eff: Dict[str, Any]) -> None:
+    damage(str(eff.get("target")), int(eff.get("amount", 0)))
+
+
+def _eff_heal(eff: Dict[str, Any]) -> None:
+    heal(str(eff.get("target")), int(eff.get("amount", 0)))
+
+
+def _eff_end(eff: Dict[str, Any]) -> None:
+    # Allow timeline events to force an ending
+    eid = eff.get("ending_id")
+    note = eff.get("note") or eff.get("message") or ""
+    try:
+        end_now(str(eid) if eid is not None else None, note=str(note))
+    except Exception:
+        pass
+
+
+_EFFECT_DISPATCH: Dict[str, Callable[[Dict[str, Any]], None]] = {
+    "add_objective": _eff_add_objective,
+    "complete_objective": _eff_complete_objective,
+    "block_objective": _eff_block_objective,
+    "relation": _eff_relation,
+    "grant": _eff_grant,
+    "damage": _eff_damage,
+    "heal": _eff_heal,
+    "end": _eff_end,
+}
+
 
 def process_events():
     outputs: List[TextBlock] = []
-    due = [ev for ev in WORLD.events if int(ev.get("at", 0)) <= WORLD.time_min]
-    WORLD.events = [ev for ev in WORLD.events if int(ev.get("at", 0)) > WORLD.time_min]
-    for ev in due:
+    # Pop only the due prefix of the heap, in (at, scheduling order)
+    events = WORLD.events
+    now = WORLD.time_min
+    fired = 0
+    cancelled = WORLD.event_cancelled
+    pending = WORLD.event_pending
+    # Effect handlers never touch the queue, so each event is handled as it is popped
+    while events and events[0][0] <= now:
+        _, seq, ev = heapq.heappop(events)
+        if cancelled and seq in cancelled:
+            cancelled.discard(seq)
+            continue
+        pending.discard(seq)
+        fired += 1
         name = ev.get("name", "(事件)")
         note = ev.get("note", "")
-        outputs.append(TextBlock(type="text", text=f"[事件] {name}：{note}")) if note else outputs.append(TextBlock(type="text", text=f"[事件] {name}"))
+        text = f"[事件] {name}：{note}" if note else f"[事件] {name}"
+        outputs.append(TextBlock(type="text", text=text))
         for eff in (ev.get("effects") or []):
             try:
                 kind = eff.get("kind")
-                if kind == "add_objective":
-                    add_objective(str(eff.get("name")))
-                elif kind == "complete_objective":
-                    complete_objective(str(eff.get("name")))
-                elif kind == "block_objective":
-                    block_objective(str(eff.get("name")), str(eff.get("reason", "")))
-                elif kind == "relation":
-                    # require absolute target (value or target); delta fallback removed
-                    a, b = eff.get("a"), eff.get("b")
-                    if a and b:
-                        if "value" in eff:
-                            v = eff.get("value")
-                        elif "target" in eff:
-                            v = eff.get("target")
-                        else:
-                            raise ValueError("relation effect requires 'value' or 'target'")
-                        set_relation(str(a), str(b), int(v), reason=str(eff.get("reason", "")))
-                elif kind == "grant":
-                    grant_item(str(eff.get("target")), str(eff.get("item")), int(eff.get("n", 1)))
-                elif kind == "damage":
-                    damage(str(eff.get("target")), int(eff.get("amount", 0)))
-                elif kind == "heal":
-                    heal(str(eff.get("target")), int(eff.get("amount", 0)))
-                elif kind == "end":
-                    # Allow timeline events to force an ending
-                    eid = eff.get("ending_id")
-                    note = eff.get("note") or eff.get("message") or ""
-                    try:
-                        end_now(str(eid) if eid is not None else None, note=str(note))
-                    except Exception:
-                        pass
+                handler = _EFFECT_DISPATCH.get(kind) if isinstance(kind, str) else None
+                if handler is not None:
+                    handler(eff)
             except Exception:
                 outputs.append(TextBlock(type="text", text=f"[事件执行失败] {eff}"))
     if outputs:
-        return ToolResponse(content=outputs, metadata={"fired": len(due)})
+        return ToolResponse(content=outputs, metadata={"fired": fired})
     return ToolResponse(content=[], metadata={"fired": 0})
 
 # ---- Atmosphere helpers ----
 def adjust_tension(delta: int):
     WORLD.tension = max(0, min(5, int(WORLD.tension) + int(delta)))
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"(气氛){'升' if delta>0 else '降' if delta<0 else '稳'}至 {WORLD.tension}")], metadata={"tension": WORLD.tension})
 
 def add_mark(text: str):
     s = str(text or "").strip()
     if s:
         WORLD.marks.append(s)
-        if len(WORLD.marks) > 10:
-            WORLD.marks = WORLD.marks[-10:]
+        WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"(环境刻痕)+{s}")], metadata={"marks": list(WORLD.marks)})
 
 
@@ -4583,9 +5189,37 @@ def _alive(name: str) -> bool:
         return False
 
 
-def _eval_when(node: Any) -> tuple[bool, List[str]]:
-    """Evaluate a when-clause recursively and return (matched, reasons)."""
-    reasons: List[str] = []
+# Reason tags produced by _eval_when; only the winning ending's reasons get formatted.
+_REASON_FORMATS: Dict[str, Any] = {
+    "not": lambda: "not",
+    "objectives": lambda require, status: f"目标{('全部' if require=='all' else '部分')}达成(status={status})",
+    "time_before": lambda t: f"时间早于{t}分钟",
+    "time_at_least": lambda t: f"时间不早于{t}分钟",
+    "actors_alive": lambda names: "角色存活:" + ", ".join(names),
+    "actors_dead": lambda names: "角色死亡:" + ", ".join(names),
+    "participants_alive_at_least": lambda need: f"存活参与者≥{need}",
+    "participants_alive_at_most": lambda cap: f"存活参与者≤{cap}",
+    "hostiles_present": lambda want: "敌对存在" if want else "已清场",
+    "marks_contains": lambda val: f"刻痕包含：{val}",
+    "marks_contains_any": lambda: "刻痕命中任一",
+    "tension_at_least": lambda need: f"气氛≥{need}",
+    "tension_at_most": lambda cap: f"气氛≤{cap}",
+    "location_is": lambda val: f"地点={val}",
+    "location_in": lambda: "地点命中",
+}
+
+
+def _format_reason(tag: str, *args: Any) -> str:
+    fmt = _REASON_FORMATS.get(tag)
+    return fmt(*args) if fmt else str(tag)
+
+
+def _eval_when(node: Any) -> tuple[bool, List[tuple]]:
+    """Evaluate a when-clause recursively and return (matched, reasons).
+
+    Reasons are (tag, *args) tuples; render them with _format_reason().
+    """
+    reasons: List[tuple] = []
     # Logical composition
     if isinstance(node, dict):
         if "all" in node:
@@ -4593,7 +5227,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
             if not isinstance(parts, list):
                 return False, []
             acc = True
-            all_reasons: List[str] = []
+            all_reasons: List[tuple] = []
             for p in parts:
                 ok, rs = _eval_when(p)
                 if ok:
@@ -4605,7 +5239,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
             parts = node.get("any")
             if not isinstance(parts, list):
                 return False, []
-            any_reasons: List[str] = []
+            any_reasons: List[tuple] = []
             for p in parts:
                 ok, rs = _eval_when(p)
                 if ok:
@@ -4614,7 +5248,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
             return False, []
         if "not" in node:
             ok, _ = _eval_when(node.get("not"))
-            return (not ok), ([] if ok else ["not"])  # minimal reason
+            return (not ok), ([] if ok else [("not",)])  # minimal reason
 
         # Leaf conditions
         # 1) objectives
@@ -4636,9 +5270,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
             vals = [_match_one(n) for n in target_names]
             ok = all(vals) if require == "all" else any(vals)
             if ok:
-                reasons.append(
-                    f"目标{('全部' if require=='all' else '部分')}达成(status={status})"
-                )
+                reasons.append(("objectives", require, status))
             return ok, reasons
 
         # 2) time gates
@@ -4649,7 +5281,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
                     return False, []
                 ok = int(WORLD.time_min) < int(t)
                 if ok:
-                    reasons.append(f"时间早于{t}分钟")
+                    reasons.append(("time_before", t))
                 return ok, reasons
             if "time_at_least" in node:
                 t = _parse_time_to_min(node.get("time_at_least"))
@@ -4657,7 +5289,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
                     return False, []
                 ok = int(WORLD.time_min) >= int(t)
                 if ok:
-                    reasons.append(f"时间不早于{t}分钟")
+                    reasons.append(("time_at_least", t))
                 return ok, reasons
 
         # 3) actors_alive / actors_dead
@@ -4673,9 +5305,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
             vals = [(_alive(n) if key == "actors_alive" else (not _alive(n))) for n in names]
             ok = all(vals) if require == "all" else any(vals)
             if ok:
-                reasons.append(
-                    ("角色存活:" if key == "actors_alive" else "角色死亡:") + ", ".join(names)
-                )
+                reasons.append((key, names))
             return ok, reasons
 
         # 4) participants alive counts
@@ -4691,7 +5321,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
                     need = None
                 ok = (need is not None) and (len(cur) >= int(need))
                 if ok:
-                    reasons.append(f"存活参与者≥{need}")
+                    reasons.append(("participants_alive_at_least", need))
                 return ok, reasons
             if "participants_alive_at_most" in node:
                 try:
@@ -4700,7 +5330,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
                     cap = None
                 ok = (cap is not None) and (len(cur) <= int(cap))
                 if ok:
-                    reasons.append(f"存活参与者≤{cap}")
+                    reasons.append(("participants_alive_at_most", cap))
                 return ok, reasons
 
         # 5) hostiles_present gate
@@ -4715,10 +5345,10 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
                 want = bool(val.get("value", True))
             else:
                 want = bool(val)
-            hp = hostiles_present(WORLD.participants or None, threshold=(thr if thr is not None else -10))
+            hp = hostiles_present(WORLD.participants or None, threshold=(thr if thr is not None else HOSTILE_RELATION_THRESHOLD))
             ok = (hp is True) if want else (hp is False)
             if ok:
-                reasons.append("敌对存在" if want else "已清场")
+                reasons.append(("hostiles_present", want))
             return ok, reasons
 
         # 6) marks_contains
@@ -4728,13 +5358,13 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
             if isinstance(val, str):
                 ok = val in marks
                 if ok:
-                    reasons.append(f"刻痕包含：{val}")
+                    reasons.append(("marks_contains", val))
                 return ok, reasons
             if isinstance(val, list):
                 # require any by default
                 ok = any(str(x) in marks for x in val)
                 if ok:
-                    reasons.append("刻痕命中任一")
+                    reasons.append(("marks_contains_any",))
                 return ok, reasons
             return False, []
 
@@ -4751,7 +5381,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
                     need = None
                 ok = (need is not None) and (tv >= int(need))
                 if ok:
-                    reasons.append(f"气氛≥{need}")
+                    reasons.append(("tension_at_least", need))
                 return ok, reasons
             if "tension_at_most" in node:
                 try:
@@ -4760,7 +5390,7 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
                     cap = None
                 ok = (cap is not None) and (tv <= int(cap))
                 if ok:
-                    reasons.append(f"气氛≤{cap}")
+                    reasons.append(("tension_at_most", cap))
                 return ok, reasons
 
         # 8) location_is
@@ -4770,12 +5400,12 @@ def _eval_when(node: Any) -> tuple[bool, List[str]]:
             if isinstance(val, str):
                 ok = (loc == val)
                 if ok:
-                    reasons.append(f"地点={val}")
+                    reasons.append(("location_is", val))
                 return ok, reasons
-            if isinstance(val, list):
-                ok = any(loc == str(x) for x in val)
+            if isinstance(val, (frozenset, list)):
+                ok = loc in (val if isinstance(val, frozenset) else frozenset(map(str, val)))
                 if ok:
-                    reasons.append("地点命中")
+                    reasons.append(("location_in",))
                 return ok, reasons
             return False, []
 
@@ -4811,7 +5441,7 @@ def evaluate_endings() -> ToolResponse:
                 "ending_id": (str(eid) or None),
                 "label": (d.get("label") or None),
                 "outcome": (d.get("outcome") or None),
-                "reasons": reasons,
+                "reasons": [_format_reason(*r) for r in reasons],
                 "time_min": int(WORLD.time_min),
             }
             WORLD.ending_state = dict(st)
@@ -4820,16 +5450,27 @@ def evaluate_endings() -> ToolResponse:
     return ToolResponse(content=[], metadata={"ok": True, "ended": False, "matched_ids": matched})
 
 
+# (world, version, result) of the last not-ended evaluation; any mutator's _touch() invalidates it.
+# Only correct while writers of the World fields marked "cached" call _touch() (see World).
+_STORY_CACHE: Optional[Tuple[World, int, Dict[str, Any]]] = None
+
+
 def story_ended() -> Dict[str, Any]:
     """Lightweight query for main/orchestrator to check end-state.
 
     - If ended already, return frozen WORLD.ending_state
-    - Else, evaluate once and return the result
+    - Else, evaluate once per WORLD.version and return the result
     """
+    global _STORY_CACHE
     if WORLD.ending_state and bool(WORLD.ending_state.get("ended")):
         return dict(WORLD.ending_state)
+    cached = _STORY_CACHE
+    if cached is not None and cached[0] is WORLD and cached[1] == WORLD.version:
+        return dict(cached[2])
     res = evaluate_endings()
-    return dict(res.metadata or {})
+    out = dict(res.metadata or {})
+    _STORY_CACHE = (WORLD, WORLD.version, out)
+    return dict(out)
 
 
 def end_now(ending_id: Optional[str] = None, note: str = "") -> ToolResponse:
@@ -4860,84 +5501,97 @@ def end_now(ending_id: Optional[str] = None, note: str = "") -> ToolResponse:
 
 from dataclasses import dataclass as _dataclass
 
-@_dataclass(frozen=True)
+def _keys(*names: str) -> Tuple[str, ...]:
+    """Interned, ordered key tuple for ToolSpec fields (cheap iteration and dict probes)."""
+    return tuple(sys.intern(n) for n in names)
+
+
+@_dataclass(frozen=True, slots=True)
 class ToolSpec:
-    required: Set[str]
-    actor_keys: Set[str] = frozenset()
-    numeric_min0: Set[str] = frozenset()   # params that must be non-negative integers
+    required: Tuple[str, ...]
+    actor_keys: Tuple[str, ...] = ()
+    numeric_min0: Tuple[str, ...] = ()     # params that must be non-negative integers
     participants_policy: str = "none"      # one of: none | source | both
     source_param: Optional[str] = None     # when policy=source, which param holds the source actor name
     extra_policy: str = "ignore"           # ignore | error
 
 
-TOOL_SPECS: Dict[str, ToolSpec] = {
+TOOL_SPECS: Mapping[str, ToolSpec] = MappingProxyType({
     "perform_attack": ToolSpec(
-        required={"attacker", "defender", "weapon"},
-        actor_keys={"attacker", "defender"},
+        required=_keys("attacker", "defender", "weapon"),
+        actor_keys=_keys("attacker", "defender"),
         participants_policy="both",
     ),
     "advance_position": ToolSpec(
-        required={"name", "target"},
-        actor_keys={"name"},
-        numeric_min0=set(),
+        required=_keys("name", "target"),
+        actor_keys=_keys("name"),
+        numeric_min0=(),
         participants_policy="source",
         source_param="name",
     ),
     "use_entrance": ToolSpec(
-        required={"name"},
-        actor_keys={"name"},
+        required=_keys("name"),
+        actor_keys=_keys("name"),
         participants_policy="source",
         source_param="name",
     ),
     "adjust_relation": ToolSpec(
-        required={"a", "b", "value"},
-        actor_keys={"a", "b"},
+        required=_keys("a", "b", "value"),
+        actor_keys=_keys("a", "b"),
         participants_policy="none",
     ),
     "transfer_item": ToolSpec(
-        required={"target", "item"},
-        actor_keys={"target"},
-        numeric_min0=set(),
+        required=_keys("target", "item"),
+        actor_keys=_keys("target"),
+        numeric_min0=(),
         participants_policy="none",
     ),
     "set_protection": ToolSpec(
-        required={"guardian", "protectee"},
-        actor_keys={"guardian", "protectee"},
+        required=_keys("guardian", "protectee"),
+        actor_keys=_keys("guardian", "protectee"),
         participants_policy="both",
     ),
     "clear_protection": ToolSpec(
-        required=set(),
-        actor_keys={"guardian", "protectee"},
+        required=(),
+        actor_keys=_keys("guardian", "protectee"),
         participants_policy="none",
     ),
     "first_aid": ToolSpec(
-        required={"name", "target"},
-        actor_keys={"name", "target"},
+        required=_keys("name", "target"),
+        actor_keys=_keys("name", "target"),
         participants_policy="both",
     ),
     "cast_arts": ToolSpec(
-        required={"attacker", "art", "target"},
-        actor_keys={"attacker", "target"},
+        required=_keys("attacker", "art", "target"),
+        actor_keys=_keys("attacker", "target"),
         participants_policy="both",
     ),
     "apply_exposure": ToolSpec(
-        required={"name"},
-        actor_keys={"name"},
-        numeric_min0={"bonus"},
+        required=_keys("name"),
+        actor_keys=_keys("name"),
+        numeric_min0=_keys("bonus"),
         participants_policy="source",
         source_param="name",
     ),
     "advance_infection_stage": ToolSpec(
-        required={"name"},
-        actor_keys={"name"},
+        required=_keys("name"),
+        actor_keys=_keys("name"),
         participants_policy="none",
     ),
     "get_infection_state": ToolSpec(
-        required={"name"},
-        actor_keys={"name"},
+        required=_keys("name"),
+        actor_keys=_keys("name"),
         participants_policy="none",
     ),
+})
+
+# Hot-path view of TOOL_SPECS for _validated_call:
+# name -> (required, actor_keys, numeric_min0, participants_policy or None for "none", source_param)
+_SPEC_FAST: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...], Tuple[str, ...], Optional[str], Optional[str]]] = {
+    name: (s.required, s.actor_keys, s.numeric_min0, None if s.participants_policy == "none" else s.participants_policy, s.source_param)
+    for name, s in TOOL_SPECS.items()
 }
+_SPEC_FAST_GET = _SPEC_FAST.get
 
 
 def _coerce_nonneg_int(v: Any) -> Optional[int]:
@@ -4948,49 +5602,102 @@ def _coerce_nonneg_int(v: Any) -> Optional[int]:
     return iv if iv >= 0 else None
 
 
-def _normalize_params_for(tool: str, params: Dict[str, Any]) -> Dict[str, Any]:
-    p = dict(params or {})
+def _normalize_params_for(tool: str, p: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply per-tool parameter rewrites in place to `p` (a private copy owned by the caller)."""
     # cast_arts: ignore any provided mp_spent (统一由系统自动结算，防止模型传入该参数)
     if tool == "cast_arts":
-        if "mp_spent" in p:
-            try:
-                del p["mp_spent"]
-            except Exception:
-                p.pop("mp_spent", None)
+        p.pop("mp_spent", None)
     return p
 
 
-def _validated_call(tool_name: str, fn, params: Dict[str, Any]) -> ToolResponse:
-    spec = TOOL_SPECS.get(tool_name)
-    if not spec:
-        return ToolResponse(content=[TextBlock(type="text", text=f"未知工具 {tool_name}")], metadata={"ok": False, "error_type": "unknown_tool"})
+# RHODES_VALIDATE=0: trusted mode for replays whose tool calls were already validated
+# upstream. _validated_call then skips the required/type/participants checks but still
+# applies the engine's parameter rewrites (advance_position target resolution and
+# steps drop, cast_arts mp_spent strip, actor-name interning), so a call means the same
+# thing in both modes.
+_TRUSTED_DISPATCH = os.getenv("RHODES_VALIDATE", "1").strip() == "0"
+
+
+# Sentinel for "key absent" in single-probe dict reads
+_MISSING = object()
+
+# Message templates for the fixed-shape validation failures (keyed by error_type)
+_VALIDATION_ERR_TEXT: Dict[str, str] = {
+    "missing_param": "缺少参数：{param}",
+    "invalid_type": "参数需为非负整数：{param}",
+}
+
+
+@lru_cache(maxsize=256)
+def _validation_error_text(error_type: str, param: str) -> str:
+    return _VALIDATION_ERR_TEXT[error_type].format(param=param)
+
+
+def _validation_error(error_type: str, param: str) -> ToolResponse:
+    """Build a missing_param/invalid_type response; only the formatted message is cached."""
+    return ToolResponse(
+        content=[TextBlock(type="text", text=_validation_error_text(error_type, param))],
+        metadata={"ok": False, "error_type": error_type, "param": param},
+    )
+
 
-    p = _normalize_params_for(tool_name, dict(params or {}))
+def _validated_call(tool_name: str, fn, params: Dict[str, Any]) -> ToolResponse:
+    # One private copy; the checks below coerce values in place
+    return _validated_call_owned(tool_name, fn, dict(params) if params else {})
 
-    # 1) required
-    for k in spec.required:
-        if k not in p or p[k] in (None, ""):
-            return ToolResponse(content=[TextBlock(type="text", text=f"缺少参数：{k}")], metadata={"ok": False, "error_type": "missing_param", "param": k})
 
-    # 2) numeric_min0
-    for k in spec.numeric_min0:
-        if k in p:
-            iv = _coerce_nonneg_int(p[k])
-            if iv is None:
-                return ToolResponse(content=[TextBlock(type="text", text=f"参数需为非负整数：{k}")], metadata={"ok": False, "error_type": "invalid_type", "param": k})
-            p[k] = iv
+def _validated_call_owned(tool_name: str, fn, p: Dict[str, Any]) -> ToolResponse:
+    """Same as _validated_call, but `p` is a dict the caller hands over (it is modified in place)."""
+    fast = _SPEC_FAST_GET(tool_name)
+    if fast is None:
+        return ToolResponse(content=[TextBlock(type="text", text=f"未知工具 {tool_name}")], metadata={"ok": False, "error_type": "unknown_tool"})
+    required, actor_keys, numeric_min0, policy, source_param = fast
+
+    p = _normalize_params_for(tool_name, p)
+
+    if not _TRUSTED_DISPATCH:
+        # 1) required
+        # required is a declaration-ordered tuple, so the first missing key reported is stable
+        for k in required:
+            v = p.get(k, _MISSING)
+            if v is _MISSING or v is None or v == "":
+                return _validation_error("missing_param", k)
+
+        # 2) numeric_min0
+        for k in numeric_min0:
+            if k in p:
+                iv = _coerce_nonneg_int(p[k])
+                if iv is None:
+                    return _validation_error("invalid_type", k)
+                p[k] = iv
 
     # 3) extra validation per tool
-    # 3.1) actor_keys to str
-    for k in spec.actor_keys:
-        if k in p and p[k] is not None:
-            p[k] = str(p[k])
+    # 3.1) actor_keys to interned str (the same objects the world dicts are keyed by)
+    for k in actor_keys:
+        v = p.get(k)
+        if v is not None:
+            p[k] = _name(v)
 
     # 3.2) target normalization for advance_position: accept [x,y] or a named point
     if tool_name == "advance_position":
         tgt = p.get("target")
-        # Case A: [x, y]
-        if isinstance(tgt, (list, tuple)) and len(tgt) >= 2:
+        # Case A0: already canonical (x, y) tuple of plain ints, e.g. re-dispatched targets
+        if (
+            tgt.__class__ is tuple
+            and len(tgt) == 2
+            and tgt[0].__class__ is int
+            and tgt[1].__class__ is int
+        ):
+            pass
+        # Case A: [x, y]; common shape (two plain ints) skips the int()/try machinery
+        elif (
+            tgt.__class__ is list
+            and len(tgt) == 2
+            and tgt[0].__class__ is int
+            and tgt[1].__class__ is int
+        ):
+            p["target"] = (tgt[0], tgt[1])
+        elif isinstance(tgt, (list, tuple)) and len(tgt) >= 2:
             try:
                 tx, ty = int(tgt[0]), int(tgt[1])
                 p["target"] = (tx, ty)
@@ -5022,16 +5729,21 @@ def _validated_call(tool_name: str, fn, params: Dict[str, Any]) -> ToolResponse:
                 metadata={"ok": False, "error_type": "invalid_type", "param": "target"},
             )
 
-    # 4) participants policy
-    if WORLD.participants:
-        if spec.participants_policy == "source" and spec.source_param:
-            src = str(p.get(spec.source_param, ""))
-            if src and src not in WORLD.participants:
-                return ToolResponse(content=[TextBlock(type="text", text=f"参与者限制：{spec.source_param}={src} 非参与者")], metadata={"ok": False, "error_type": "not_participant", "param": spec.source_param, "value": src})
-        elif spec.participants_policy == "both":
-            for k in spec.actor_keys:
+    # 4) participants policy (skipped for policy=none, in trusted mode, or when no participants are set).
+    # The participants list itself is the "active" flag: it is empty outside scenes, and a
+    # separate boolean would go stale when the list is cleared in place.
+    if policy and WORLD.participants and not _TRUSTED_DISPATCH:
+        pset = _participant_set()
+        if policy == "source" and source_param:
+            src = str(p.get(source_param, ""))
+            if src and src not in pset:
+                return ToolResponse(content=[TextBlock(type="text", text=f"参与者限制：{source_param}={src} 非参与者")], metadata={"ok": False, "error_type": "not_participant", "param": source_param, "value": src})
+        elif policy == "both":
+            # Relies on step 3.1: every present actor key is already an interned str there,
+            # so no isinstance check is needed here (empty/absent values are left to fn)
+            for k in actor_keys:
                 v = p.get(k)
-                if isinstance(v, str) and v not in WORLD.participants:
+                if v and v not in pset:
                     return ToolResponse(content=[TextBlock(type="text", text=f"参与者限制：{k}={v} 非参与者")], metadata={"ok": False, "error_type": "not_participant", "param": k, "value": v})
 
     # 5) call
@@ -5043,28 +5755,42 @@ def _validated_call(tool_name: str, fn, params: Dict[str, Any]) -> ToolResponse:
         return ToolResponse(content=[TextBlock(type="text", text=str(exc))], metadata={"ok": False, "error_type": exc.__class__.__name__})
 
 
+def _validated_entry(tool_name: str, fn: Callable[..., ToolResponse]) -> Callable[..., ToolResponse]:
+    """Wrap `fn` as callable(**params) that goes through _validated_call under `tool_name`."""
+    def _call(**p):
+        # **p is already a fresh dict, so hand it over instead of copying it again
+        return _validated_call_owned(tool_name, fn, p)
+    _call.__name__ = tool_name
+    return _call
+
+
+def _adv_no_steps(**p):
+    # Drop any external 'steps' parameter to enforce auto-movement only
+    p.pop("steps", None)
+    return _validated_call_owned("advance_position", move_towards, p)
+
+
+# Built once at import; validated_tool_dispatch() hands out copies of this table.
+_DISPATCH: Dict[str, Callable[..., ToolResponse]] = {
+    "perform_attack": _validated_entry("perform_attack", attack_with_weapon),
+    "advance_position": _adv_no_steps,
+    "use_entrance": _validated_entry("use_entrance", use_entrance),
+    "adjust_relation": _validated_entry("adjust_relation", set_relation),
+    "transfer_item": _validated_entry("transfer_item", grant_item),
+    "set_protection": _validated_entry("set_protection", set_guard),
+    "clear_protection": _validated_entry("clear_protection", clear_guard),
+    "first_aid": _validated_entry("first_aid", first_aid),
+    "cast_arts": _validated_entry("cast_arts", cast_arts),
+    "apply_exposure": _validated_entry("apply_exposure", apply_exposure),
+    "advance_infection_stage": _validated_entry("advance_infection_stage", advance_infection_stage),
+    "get_infection_state": _validated_entry("get_infection_state", get_infection_state),
+}
+
+
 def validated_tool_dispatch() -> Dict[str, Any]:
     """Return a mapping of tool-name -> validated function callable(**params).
 
     These names are expected by the LLM prompt (perform_attack, advance_position, ...).
+    The wrappers are built once at import; each call returns a shallow copy of the table.
     """
-    def _adv_no_steps(**p):
-        # Drop any external 'steps' parameter to enforce auto-movement only
-        if "steps" in p:
-            p = {k: v for k, v in p.items() if k != "steps"}
-        return _validated_call("advance_position", move_towards, p)
-
-    return {
-        "perform_attack": lambda **p: _validated_call("perform_attack", attack_with_weapon, p),
-        "advance_position": _adv_no_steps,
-        "use_entrance": lambda **p: _validated_call("use_entrance", use_entrance, p),
-        "adjust_relation": lambda **p: _validated_call("adjust_relation", set_relation, p),
-        "transfer_item": lambda **p: _validated_call("transfer_item", grant_item, p),
-        "set_protection": lambda **p: _validated_call("set_protection", set_guard, p),
-        "clear_protection": lambda **p: _validated_call("clear_protection", clear_guard, p),
-        "first_aid": lambda **p: _validated_call("first_aid", first_aid, p),
-        "cast_arts": lambda **p: _validated_call("cast_arts", cast_arts, p),
-        "apply_exposure": lambda **p: _validated_call("apply_exposure", apply_exposure, p),
-        "advance_infection_stage": lambda **p: _validated_call("advance_infection_stage", advance_infection_stage, p),
-        "get_infection_state": lambda **p: _validated_call("get_infection_state", get_infection_state, p),
-    }
+    return dict(_DISPATCH)
@@ -1,5 +1,8 @@
 import random
 
+import pytest
+
+import world.core as core
 from world.core import (
     WORLD,
     get_position,
@@ -9,6 +12,14 @@ from world.core import (
     set_weapon_defs,
     grant_item,
     attack_with_weapon,
+    list_adjacent_units,
+    skill_check_coc,
+    batch_skill_check_coc,
+    schedule_event,
+    cancel_event,
+    process_events,
+    validated_tool_dispatch,
+    hostiles_present,
 )
 
 
@@ -20,6 +31,44 @@ def test_set_and_get_position():
     assert res2.metadata.get("position") == [2, 3]
 
 
+def test_adjacent_units_track_moves_and_direct_edits():
+    for i in range(6):
+        set_position(f"U{i}", i * 3, 0)
+    set_position("Me", 0, 1)
+    assert list_adjacent_units("Me") == [("U0", 1)]
+    set_position("U1", 1, 1)
+    assert list_adjacent_units("Me") == [("U0", 1), ("U1", 1)]
+    # Index must not serve stale cells after the dict is edited directly
+    WORLD.positions.pop("U0")
+    assert list_adjacent_units("Me") == [("U1", 1)]
+    # ...including edits that keep the number of entries unchanged
+    WORLD.positions["U1"] = (0, 2)
+    assert list_adjacent_units("Me") == [("U1", 1)]
+    WORLD.positions["U1"] = (5, 5)
+    WORLD.positions["U0"] = (1, 1)
+    WORLD.positions.pop("U2")
+    assert list_adjacent_units("Me") == [("U0", 1)]
+
+
+def test_hostiles_present_sees_direct_relation_edits():
+    WORLD.relations.clear()
+    set_position("A", 0, 0)
+    set_position("B", 5, 5)
+    assert hostiles_present() is False
+    WORLD.relations[("A", "B")] = -90
+    assert hostiles_present() is True
+    WORLD.relations[("A", "B")] = 0
+    assert hostiles_present() is False
+    WORLD.relations.clear()
+
+
+def test_participant_set_tracks_in_place_edits():
+    core.set_participants(["A", "B"])
+    assert core._participant_set() == {"A", "B"}
+    WORLD.participants[1] = "X"
+    assert core._participant_set() == {"A", "X"}
+
+
 def test_stat_block_and_attack():
     # Deterministic randomness
     random.seed(42)
@@ -48,6 +97,33 @@ def test_stat_block_and_attack():
     assert res.metadata.get("reach_ok") is True
 
 
+def test_participant_gates_follow_in_place_edits():
+    for nm, pos in (("A", (0, 0)), ("B", (0, 1)), ("X", (1, 0))):
+        set_character(name=nm, hp=10, max_hp=10)
+        set_position(nm, *pos)
+    set_weapon_defs(
+        {
+            "training_blade": {
+                "label": "训练短刃",
+                "reach_steps": 1,
+                "skill": "Fighting_Brawl",
+                "defense_skill": "Dodge",
+                "damage": "1d4",
+                "damage_type": "physical",
+            }
+        }
+    )
+    grant_item("A", "training_blade", 1)
+    core.set_participants(["A", "B"])
+    WORLD.participants[1] = "X"
+    res = attack_with_weapon("A", "B", weapon="training_blade")
+    assert res.metadata.get("error_type") == "not_participant"
+    res = attack_with_weapon("A", "X", weapon="training_blade")
+    assert res.metadata.get("error_type") != "not_participant"
+    res = core.move_towards("B", (5, 5))
+    assert res.metadata.get("error_type") == "not_participant"
+
+
 def test_roll_dice_parse_and_total():
     random.seed(123)
     out = roll_dice("2d6+1")
@@ -56,6 +132,48 @@ def test_roll_dice_parse_and_total():
     assert 3 <= total <= 13
 
 
+def test_batch_skill_check_matches_single_checks():
+    names = ["A", "B", "C"]
+    random.seed(7)
+    single = [skill_check_coc(n, "Perception").metadata for n in names]
+    random.seed(7)
+    batch = [r.metadata for r in batch_skill_check_coc(names, "Perception")]
+    assert batch == single
+
+
+def test_events_fire_in_order_and_skip_cancelled():
+    WORLD.events = []
+    WORLD.event_cancelled.clear()
+    WORLD.event_pending.clear()
+    now = WORLD.time_min
+    schedule_event("late", now + 5)
+    first = schedule_event("first", now).metadata["id"]
+    dropped = schedule_event("dropped", now).metadata["id"]
+    schedule_event("second", now)
+    assert cancel_event(dropped).metadata["ok"] is True
+    assert cancel_event(dropped).metadata["ok"] is False
+    res = process_events()
+    assert [blk["text"] for blk in res.content] == ["[事件] first", "[事件] second"]
+    assert res.metadata["fired"] == 2
+    assert [ev[2]["name"] for ev in WORLD.events] == ["late"]
+    assert first != dropped
+
+
+def test_cancel_rejects_fired_and_compacted_events():
+    WORLD.events = []
+    WORLD.event_cancelled.clear()
+    WORLD.event_pending.clear()
+    now = WORLD.time_min
+    fired = schedule_event("fired", now).metadata["id"]
+    process_events()
+    assert cancel_event(fired).metadata["ok"] is False
+    # A lone cancelled entry triggers compaction, which clears the cancelled set
+    gone = schedule_event("gone", now + 5).metadata["id"]
+    assert cancel_event(gone).metadata["ok"] is True
+    assert WORLD.events == [] and not WORLD.event_cancelled
+    assert cancel_event(gone).metadata["ok"] is False
+
+
 def test_attack_respects_reach_without_auto_move():
     random.seed(1)
     set_character(name="A", hp=10, max_hp=10)
@@ -81,3 +199,84 @@ def test_attack_respects_reach_without_auto_move():
 
 
 # 自动靠近攻击已移除：不再测试 auto_move 行为
+
+
+def test_trusted_dispatch_keeps_parameter_rewrites(monkeypatch):
+    monkeypatch.setattr(core, "_TRUSTED_DISPATCH", True)
+    set_character(name="Me", hp=5, max_hp=5)
+    set_position("Me", 0, 0)
+    set_position("Gate", 3, 0)
+    adv = validated_tool_dispatch()["advance_position"]
+    # Named targets still resolve and external steps are still ignored
+    res = adv(name="Me", target="Gate", steps=1)
+    assert res.metadata.get("ok") is True
+    assert WORLD.positions["Me"] == (3, 0)
+
+
+def test_dispatch_participants_policy_both():
+    for nm in ("A", "B", "C"):
+        set_character(name=nm, hp=10, max_hp=10)
+    core.set_participants(["A", "B"])
+    attack = validated_tool_dispatch()["perform_attack"]
+    res = attack(attacker="A", defender="C", weapon="none")
+    assert res.metadata == {"ok": False, "error_type": "not_participant", "param": "defender", "value": "C"}
+    # In-place edits of the list are honoured by the dispatch check as well
+    WORLD.participants[1] = "C"
+    res = attack(attacker="A", defender="B", weapon="none")
+    assert res.metadata.get("param") == "defender" and res.metadata.get("value") == "B"
+    res = attack(attacker="A", defender="C", weapon="none")
+    assert res.metadata.get("error_type") != "not_participant"
+
+
+def test_eval_int_expr_sums_and_rejects():
+    assert core._eval_int_expr("2") == 2
+    assert core._eval_int_expr("1+1") == 2
+    assert core._eval_int_expr(" 3 - 1 ") == 2
+    assert core._eval_int_expr("-2+-1") == -3
+    for bad in ("", "1+", "1 2", "2*2", "(1+1)", "a"):
+        with pytest.raises(ValueError):
+            core._eval_int_expr(bad)
+    # cast_arts reports these shapes as art_duration_expr_invalid instead of defaulting to 1 round
+    assert not core._DURATION_CHARS.issuperset("2*2")
+    assert not core._DURATION_CHARS.issuperset("(1+1)")
+    assert core._DURATION_CHARS.issuperset("3 - 1")
+
+
+def test_snapshot_cache_sees_mutations():
+    WORLD.scene_of.update({"A": "s1", "B": "s1"})
+    set_character(name="A", hp=5, max_hp=5)
+    try:
+        assert core.visible_snapshot_for("A")["characters"]["A"]["hp"] == 5
+        set_character(name="A", hp=3, max_hp=5)
+        assert core.visible_snapshot_for("A")["characters"]["A"]["hp"] == 3
+        # Infection defaults written for a new sheet invalidate the snapshot too
+        WORLD.scene_of["C"] = "s1"
+        core._ensure_infection_block("C")
+        assert "C" in core.visible_snapshot_for("A")["characters"]
+        # Plain reads do not bump the version
+        v = WORLD.version
+        core._ensure_infection_block("C")
+        assert WORLD.version == v
+        for op in (
+            lambda: core.set_cover("A", "half"),
+            lambda: core.add_status("A", "stunned", duration_rounds=1),
+            lambda: core.remove_status("A", "stunned"),
+        ):
+            before = WORLD.version
+            op()
+            assert WORLD.version > before
+    finally:
+        WORLD.scene_of.clear()
+
+
+def test_story_cache_sees_mutations():
+    WORLD.endings_defs = [{"id": "b_down", "when": {"actors_dead": {"names": ["B"]}}}]
+    WORLD.ending_state = None
+    set_character(name="B", hp=5, max_hp=5)
+    try:
+        assert core.story_ended()["ended"] is False
+        set_character(name="B", hp=0, max_hp=5)
+        assert core.story_ended()["ended"] is True
+    finally:
+        WORLD.endings_defs = []
+        WORLD.ending_state = None